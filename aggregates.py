@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class SpeciesStats:
+    '''
+        Running totals over the living critters of one species. The World adds and removes critters as they're
+        tracked and untracked, and critters report changes to their age, energy and traits as they happen,
+        so means and the highest generation can be read at any time without walking the population.
+        The float totals pick up rounding error with every change, so the World rebases them now and then.
+    '''
+    __slots__ = ('Species', 'count', 'age', 'energy', 'generation', 'generations', 'traits')
+
+    def __init__(self, Species):
+        self.Species = Species
+        self.count = 0
+        self.age = 0
+        self.energy = 0.
+        self.generation = 0
+        self.generations = {}   # generation -> number of living critters from it
+        self.traits = np.zeros(len(Species.SCHEMA))
+
+    def add(self, critter):
+        self.count += 1
+        self.age += critter.age
+        self.energy += critter.energy
+        self.generation += critter.generation
+        self.generations[critter.generation] = self.generations.get(critter.generation, 0) + 1
+        self.traits += critter.genome
+
+    def remove(self, critter):
+        self.count -= 1
+        self.age -= critter.age
+        self.energy -= critter.energy
+        self.generation -= critter.generation
+        self.generations[critter.generation] -= 1
+        if not self.generations[critter.generation]:
+            del self.generations[critter.generation]
+        self.traits -= critter.genome
+
+    def rebase(self, critters):
+        # sums the totals afresh from the species' living critters
+        self.age = sum(critter.age for critter in critters)
+        self.energy = float(np.sum([critter.energy for critter in critters]))
+        self.traits = np.sum([critter.genome for critter in critters], axis=0) if critters else np.zeros(len(self.traits))
+
+    @property
+    def max_generation(self):
+        return max(self.generations, default=0)
+
+    def mean(self, name):
+        # mean age, energy, generation or trait; None with no critters left
+        if not self.count:
+            return None
+        if name in self.Species.SCHEMA.index:
+            return self.traits[self.Species.SCHEMA.index[name]] / self.count
+        return getattr(self, name) / self.count
+
+    def trait_means(self):
+        return dict(zip(self.Species.SCHEMA.names, (self.traits / self.count).tolist())) if self.count else {}
@@ -1,10 +1,9 @@
 from world import World
 from critter import Critter, Decisions, Results
-from datavis import Data
+from datavis import MetricsRecorder
 
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from random import randint
 
 
 
@@ -19,14 +18,14 @@ def main():
 
 
     world.set_up_food()
-    world.add_critters([Critter(world, age=randint(0,Critter.MAX_AGE)) for _ in range(start_pop)])
+    world.populate(Critter, start_pop, ages=world.placement_rng.integers(0, Critter.MAX_AGE, start_pop, endpoint=True))
 
     animate_world(world, turns)
 
 
 
 def animate_world(world, turns):
-    data = Data(turns)
+    data = MetricsRecorder()
     fig, ax = plt.subplots()
     ax.set_xlim(-0.1*world.size, 1.1*world.size)
     ax.set_ylim(-0.1*world.size, 1.1*world.size)
@@ -37,21 +36,16 @@ def animate_world(world, turns):
     def draw(world_state):
         turn_pop = world_state.pop_count
         all_critters = world_state.all_critters
-        all_food = world_state.all_food
+        _, food_locs = world_state.visible_foods()
         turn = world_state.turn
 
-        data.pop[turn] = turn_pop
-        data.avg_age[turn] = sum([c.age for c in all_critters]) / turn_pop
-        #data.avg_generation[turn] = sum([c.generation for c in all_critters]) / turn_pop
-        data.max_generation[turn] = max([c.generation for c in all_critters])
-
-        data.starved[turn] = len([d for d,_ in world_state.decisions.values() if d is Decisions.STARVE])
-        data.old_age[turn] = len([d for d,_ in world_state.decisions.values() if d is Decisions.DEPART])
-        data.prey[turn] = len([r for r in world_state.results.values() if r is Results.KILLED])
-        data.born[turn] = sum([n for d,n in world_state.decisions.values() if d is Decisions.GIVE_BIRTH])
-
-        data.avg_energy[turn] = sum([c.energy for c in all_critters]) / turn_pop
-        data.food_energy[turn] = sum([f.amount_left for f in all_food])
+        data.record(turn, **world_state.population_summary(),
+            starved = len([d for d,_ in world_state.decisions.values() if d is Decisions.STARVE]),
+            old_age = len([d for d,_ in world_state.decisions.values() if d is Decisions.DEPART]),
+            prey = len([r for r in world_state.results.values() if r is Results.KILLED]),
+            born = sum([n for d,n in world_state.decisions.values() if d is Decisions.GIVE_BIRTH]),
+            food_energy = world_state.food_energy,
+        )
 
         critter_xs = []
         critter_ys = []
@@ -60,17 +54,10 @@ def animate_world(world, turns):
             critter_xs.append(x)
             critter_ys.append(y)
 
-        food_xs = []
-        food_ys = []
-        for food in all_food:
-            x,y = food.loc
-            food_xs.append(x)
-            food_ys.append(y)
-
         critter_line.set_xdata(critter_xs)
         critter_line.set_ydata(critter_ys)
-        food_line.set_xdata(food_xs)
-        food_line.set_ydata(food_ys)
+        food_line.set_xdata(food_locs[:,0])
+        food_line.set_ydata(food_locs[:,1])
 
         ax.set_title(f"Turn: {turn}  Pop: {turn_pop}")
 
@@ -78,9 +65,11 @@ def animate_world(world, turns):
     ani = animation.FuncAnimation(fig, draw, world.get_generator(turns), 
             blit=False, interval=1, repeat=True, repeat_delay=0, save_count=turns)
 
-    #data.compile_plots()
-
-    plt.show()
+    try:
+        plt.show()
+        #data.compile_plots()
+    finally:
+        data.close()    # removes its temporary file
 
 
 
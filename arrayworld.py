@@ -0,0 +1,769 @@
+from world import World
+from food import Food
+from foodfield import FoodField, check_rules
+from critter import Critter, Decisions, Results
+from biology import BioAssumptions
+import perception
+import util
+
+import numpy as np
+from math import pi
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Critter behaviour the engine reproduces in bulk; species overriding any of it need the object World
+DEFAULT_RULES = (
+    'take_turn', 'decide', 'seek_food', 'seek_mate', 'flee', 'wander',
+    'resolve_turn', 'eat', 'predate', 'give_birth', 'reproduce_sex', 'reproduce_asex', '_move', '_die',
+    '_clone', '_combine_chromosomes',
+    '_food_eval', '_mate_eval', '_threat_eval', '_food_competition_eval',
+    '_is_predator', '_food_competitor', '_valid_mate', '_is_adult', '_same_species',
+    'visible_critters', 'visible_food',
+)
+
+IDLE = Decisions.IDLE.value
+DEPART = Decisions.DEPART.value
+STARVE = Decisions.STARVE.value
+EAT = Decisions.EAT.value
+BREED_SEX = Decisions.BREED_SEX.value
+GIVE_BIRTH = Decisions.GIVE_BIRTH.value
+SEEK_FOOD = Decisions.SEEK_FOOD.value
+SEEK_MATE = Decisions.SEEK_MATE.value
+WANDER = Decisions.WANDER.value
+MOVES = [d.value for d in (Decisions.SEEK_FOOD, Decisions.SEEK_MATE, Decisions.FLEE, Decisions.WANDER)]
+
+SUCCESS = Results.SUCCESS.value
+FAILURE = Results.FAILURE.value
+
+
+class ArrayWorld(World):
+
+    DESCRIPTION = "The default world, simulated column-wise with NumPy"
+
+    # per-critter state; every column has one entry (row) per living critter
+    COLUMNS = ('ids', 'kind', 'loc', 'energy', 'age', 'max_age', 'gestation', 'heading', 'generation', 'birth',
+               'reach', 'max_speed', 'max_energy', 'metabolic_upkeep', 'traits', 'embryo',
+               'last_decision', 'last_result')
+
+    TILES = 4   # tiles per side the decision phase is split into when running on a process pool
+
+    def __init__(self, size=World.SIZE, food_drops=None, seed=None, workers=0, food_field=False):
+        self.food = FoodField() if food_field else None     # opt-in columns of food in place of Food objects
+        super().__init__(size, food_drops, seed)
+        if self.food is not None:
+            for drop in self.food_drops:
+                check_rules(drop.food, type(self).__name__)
+        self.pool = ProcessPoolExecutor(workers) if workers else None    # opt-in parallel decision phase
+        self.kinds = []         # species classes, indexed by the kind column
+        self.bios = []          # BioAssumptions used for each kind
+        self.trait_names = []   # columns of the traits matrix; a species' missing traits are NaN
+        self.trait_idx = {}
+        self.next_id = 0
+        self._rows = None       # id -> row, rebuilt on demand after the population changes
+        for name, column in self._blank(0).items():
+            setattr(self, name, column)
+
+    @property
+    def n(self):
+        return len(self.ids)
+
+    @property
+    def pop_count(self):
+        return self.n
+
+    @property
+    def all_critters(self):
+        return [CritterView(self, i) for i in self.ids.tolist()]
+
+    # World bookkeeping that only exists for critter objects
+    @property
+    def decisions(self):
+        return {CritterView(self, i): (Decisions(d), None) for i, d in zip(self.ids.tolist(), self.last_decision.tolist())}
+
+    @decisions.setter
+    def decisions(self, value):
+        if value:
+            raise AttributeError("decisions are derived from the last_decision column")
+
+    @property
+    def results(self):
+        return {CritterView(self, i): Results(r) for i, r in zip(self.ids.tolist(), self.last_result.tolist())}
+
+    @results.setter
+    def results(self, value):
+        if value:
+            raise AttributeError("results are derived from the last_result column")
+
+    # COLUMNS
+
+    def _blank(self, n):
+        num_traits = len(self.trait_names)
+        return {
+            'ids': np.zeros(n, np.int64),
+            'kind': np.zeros(n, np.int16),
+            'loc': np.zeros((n, 2)),
+            'energy': np.zeros(n),
+            'age': np.zeros(n, np.int64),
+            'max_age': np.zeros(n, np.int64),
+            'gestation': np.full(n, np.nan),        # NaN when not pregnant
+            'heading': np.zeros(n),
+            'generation': np.zeros(n, np.int64),
+            'birth': np.zeros(n, np.int64),
+            'reach': np.zeros(n),
+            'max_speed': np.zeros(n),
+            'max_energy': np.zeros(n),
+            'metabolic_upkeep': np.zeros(n),
+            'traits': np.full((n, num_traits), np.nan),
+            'embryo': np.full((n, num_traits), np.nan),    # traits of the child being carried
+            'last_decision': np.full(n, IDLE, np.int8),
+            'last_result': np.full(n, SUCCESS, np.int8),
+        }
+
+    def _append(self, columns):
+        count = len(columns['ids'])
+        columns['ids'][:] = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), columns[name]]))
+        self._rows = None
+
+    def _keep(self, mask):
+        for name in self.COLUMNS:
+            setattr(self, name, getattr(self, name)[mask])
+        self._rows = None
+
+    def row_of(self, critter_id):
+        if self._rows is None:
+            self._rows = dict(zip(self.ids.tolist(), range(self.n)))
+        return self._rows[critter_id]
+
+    def trait(self, name, rows=slice(None)):
+        if not self.n and name not in self.trait_idx:
+            return np.zeros(0)  # no species registered yet, so no critters to have the trait
+        return self.traits[rows, self.trait_idx[name]]
+
+    def _kind_attr(self, name):
+        # a per-row array of a class attribute of each critter's species
+        return np.array([getattr(Species, name) for Species in self.kinds])[self.kind]
+
+    def _register(self, Species, bio):
+        if Species in self.kinds:
+            return self.kinds.index(Species)
+        overridden = [rule for rule in DEFAULT_RULES if getattr(Species, rule) is not getattr(Critter, rule)]
+        if overridden:
+            raise TypeError(f"{Species.__name__} overrides {', '.join(overridden)}; "
+                            f"{type(self).__name__} only runs the default Critter rules")
+        new_traits = [t for t in Species.START_TRAITS if t not in self.trait_idx]
+        for trait in new_traits:
+            self.trait_idx[trait] = len(self.trait_names)
+            self.trait_names.append(trait)
+        pad = np.full((self.n, len(new_traits)), np.nan)
+        self.traits = np.hstack([self.traits, pad])
+        self.embryo = np.hstack([self.embryo, pad])
+        self.kinds.append(Species)
+        self.bios.append(bio)
+        self.species.add(Species)
+        return len(self.kinds) - 1
+
+    # CRITTERS
+
+    def add_critter(self, critter):
+        self.add_critters([critter])
+
+    def add_critters(self, critters):
+        # copies the state of Critter objects into new rows; the objects themselves aren't kept
+        critters = list(critters)
+        kinds = [self._register(type(c), c.bio) for c in critters]
+        columns = self._blank(len(critters))
+        for row, (kind, c) in enumerate(zip(kinds, critters)):
+            columns['kind'][row] = kind
+            columns['loc'][row] = c.loc
+            columns['energy'][row] = c.energy
+            columns['age'][row] = c.age
+            columns['max_age'][row] = c.max_age
+            columns['gestation'][row] = np.nan if c.gestation_timer is None else c.gestation_timer
+            columns['heading'][row] = c.last_heading
+            columns['generation'][row] = c.generation
+            columns['birth'][row] = c.birth
+            columns['reach'][row] = c.reach
+            columns['max_speed'][row] = c.max_speed
+            columns['max_energy'][row] = c.max_energy
+            columns['metabolic_upkeep'][row] = c.metabolic_upkeep
+            columns['traits'][row, self._genome_cols(kind)] = c.genome
+            if c.offspring_genomes:
+                columns['embryo'][row, self._genome_cols(kind)] = c.offspring_genomes[0][0]
+        self._append(columns)
+
+    def populate(self, Species, count, bio=BioAssumptions, ages=None):
+        # adds *count* new rows with the species' starting traits, without building any Critter objects
+        kind = self._register(Species, bio)
+        genomes = np.tile(Species.SCHEMA.defaults, (count, 1))
+        derived = bio.derive_batch(Species, genomes, self)
+        columns = self._blank(count)
+        columns['kind'][:] = kind
+        columns['loc'][:] = self.placement_rng.random((count, 2)) * self.size
+        columns['age'][:] = 0 if ages is None else ages
+        columns['max_age'][:] = Species.MAX_AGE
+        columns['heading'][:] = self.placement_rng.uniform(-pi, pi, count)
+        columns['birth'][:] = self.turn
+        for col, name in enumerate(BioAssumptions.STATS):
+            columns[name][:] = derived[:,col]
+        columns['energy'][:] = .5 * columns['max_energy']
+        columns['traits'][:, self._genome_cols(kind)] = genomes
+        self._append(columns)
+
+    def search_critters(self, loc, search_range):
+        x,y = loc
+        dx = np.abs(self.loc[:,0] - x)
+        dy = np.abs(self.loc[:,1] - y)
+        rows = np.flatnonzero((dx <= search_range) & (dy <= search_range))
+        return [CritterView(self, i) for i in self.ids[rows].tolist()]
+
+    def perception_radii(self):
+        return self.trait('per_critter'), self.trait('per_food')
+
+    def tune_chunks(self):
+        # critters live in the columns rather than the chunk map, so only the food index is worth retuning,
+        # and only while it holds the food
+        if self.food is None:
+            self._tune(self.avail_food, self.trait('per_food'))
+
+    def _bio_eval(self, rows, formula):
+        # evaluates formula(bio, critters) once per species, with the critters' traits as arrays
+        out = np.zeros(len(rows))
+        for kind in np.unique(self.kind[rows]).tolist():
+            group = self.kind[rows] == kind
+            critters = _Columns(self, kind, rows[group], group)
+            out[group] = formula(self.bios[kind], critters)
+        return out
+
+    def _genome_cols(self, kind):
+        # columns of the traits matrix holding a species' genome, in its TraitSchema order
+        return [self.trait_idx[t] for t in self.kinds[kind].SCHEMA.names]
+
+    # FOOD
+    # with a FoodField, food is kept in its columns and the chunk map of Food objects stays empty
+
+    @property
+    def resources(self):
+        return self._resources
+
+    @resources.setter
+    def resources(self, value):
+        # resource patches only join the Food objects, so with a FoodField they'd never be seen or bitten
+        if value is not None and self.food is not None:
+            raise ValueError("resources can't be combined with a FoodField")
+        self._resources = value
+
+    @property
+    def food_count(self):
+        return super().food_count if self.food is None else len(self.food)
+
+    @property
+    def food_energy(self):
+        return super().food_energy if self.food is None else self.food.energy()
+
+    def register_food_drop(self, food=None, mu=5, cv=0.2, fertility=None, season=None):
+        if self.food is not None:
+            check_rules(Food if food is None else food, type(self).__name__)
+        super().register_food_drop(food, mu, cv, fertility, season)
+
+    def drop_food(self):
+        if self.food is None:
+            return super().drop_food()
+        for drop in self.food_drops:
+            adjusted_mean = self.drop_mean(drop)
+            drop_count = max(0, round(self.food_rng.normal(adjusted_mean, adjusted_mean*drop.cv)))
+            self.food.spawn(self.drop_locs(drop, drop_count), drop.food.DEFAULT_AMOUNT)
+
+    def expire_food(self):
+        if self.food is None:
+            return super().expire_food()
+        self.food.decay()
+
+    def set_up_food(self):
+        if self.food is None:
+            return super().set_up_food()
+        if not self.food_drops:
+            self.register_food_drop()
+        temp = self.abundance
+        self.abundance *= 50
+        self.drop_food()
+        self.abundance = temp
+        self.food.set_amounts(self.food_rng.random(len(self.food.amount)) * self.food.original)
+
+    def _food_columns(self):
+        # (foods, loc, amount, group) of the food available this turn; foods are what target indices refer to:
+        # FoodField entries, or Food objects followed by any resource patches
+        if self.food is not None:
+            return self.food.columns()
+        foods, food_loc = self.avail_food.packed()
+        food_amount = np.array([f.amount_left for f in foods.tolist()], dtype=float)
+        if self.resources is not None:
+            patches, centers, amounts = self.resources.live()
+            foods = np.concatenate([foods, patches])
+            food_loc = np.concatenate([food_loc, centers])
+            food_amount = np.concatenate([food_amount, amounts])
+        return foods, food_loc, food_amount, None
+
+    def _bite_food(self, foods, food, bite):
+        if self.food is not None:
+            self.food.bite(foods[food], bite)
+            return
+        bitten = np.bincount(food, weights=bite, minlength=len(foods))
+        for f in np.flatnonzero(bitten > 0).tolist():
+            foods[f].bite(bitten[f])
+
+    # ADMIN
+
+    def step(self):
+
+        self.turn += 1
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start(self.turn)
+
+        self.expire_food()
+        if self.resources is not None:
+            self.resources.step(self.abundance)
+        if profiler is not None:
+            profiler.lap('food')
+        self.drop_food()
+        if profiler is not None:
+            profiler.lap('drop_food')
+
+        self.age += 1
+        self.gestation -= 1     # NaN stays NaN
+
+        foods, food_loc, food_amount, _ = self._food_columns()
+
+        # drawn for everyone up front, so the decisions don't depend on how the phase is split up
+        wander_phi = self.wander_rng.vonmises(self.heading, self.trait('wander_faith'))
+
+        decide = self._decide if self.pool is None else self._decide_tiled
+        decision, rho, phi, target = decide(food_loc, food_amount, wander_phi)
+        if profiler is not None:
+            profiler.count_decision_values(decision)
+            profiler.lap('decide')
+        self._resolve(decision, rho, phi, target, foods, food_amount)
+        if self.turn % self.REBUCKET_EVERY == 0:
+            self.tune_chunks()
+        if profiler is not None:
+            profiler.lap('resolve')
+            profiler.end()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _decide_tiled(self, food_loc, food_amount, wander_phi):
+        # _decide run on the pool, one square tile of the world per task; each task also gets a halo of the critters
+        # and food its critters could perceive. A decision only depends on what its critter perceives and pair lists
+        # are kept in row order, so this matches _decide exactly, whatever the number of workers.
+        n = self.n
+        halo = max(self.trait('per_critter').max(initial=0), self.trait('per_food').max(initial=0))
+        width = self.size / self.TILES
+        cell = np.clip(np.floor(self.loc / width).astype(np.int64), 0, self.TILES-1)
+        tile = cell[:,0] * self.TILES + cell[:,1]
+        shared = {'kinds': self.kinds, 'bios': self.bios, 'trait_names': self.trait_names, 'trait_idx': self.trait_idx,
+                  'size': self.size, 'TURN_DURATION': self.TURN_DURATION, 'profiler': None}
+
+        jobs = []
+        for t in np.unique(tile).tolist():
+            # the outer tiles reach past the edges of the world, for anything that has wandered out
+            lo = np.array(divmod(t, self.TILES)) * width
+            hi = lo + width + halo
+            lo = np.where(lo > 0, lo - halo, -np.inf)
+            hi = np.where(hi - halo < self.size, hi, np.inf)
+            rows = np.flatnonzero(np.all((self.loc >= lo) & (self.loc <= hi), axis=1))
+            owned = np.flatnonzero(tile[rows] == t)
+            food = np.flatnonzero(np.all((food_loc >= lo) & (food_loc <= hi), axis=1))
+            state = {name: getattr(self, name)[rows] for name in self.COLUMNS}
+            state.update(shared)
+            job = self.pool.submit(_decide_tile, state, owned, food_loc[food], food_amount[food], wander_phi[rows])
+            jobs.append((rows[owned], rows, food, job))
+
+        decision = np.full(n, IDLE, np.int8)
+        rho = np.zeros(n)
+        phi = np.zeros(n)
+        target = np.full(n, -1, np.int64)
+        for own, rows, food, job in jobs:
+            decision[own], rho[own], phi[own], tile_target = job.result()
+            # targets come back as tile-local food and critter indices
+            eat = decision[own] == EAT
+            mate = decision[own] == BREED_SEX
+            tile_target[eat] = food[tile_target[eat]]
+            tile_target[mate] = rows[tile_target[mate]]
+            target[own] = tile_target
+        return decision, rho, phi, target
+
+    def _decide(self, food_loc, food_amount, wander_phi, food_group=None):
+        # food_group: with replica worlds (see BatchWorld), the replica each food item belongs to
+        n = self.n
+        decision = np.full(n, IDLE, np.int8)
+        rho = np.zeros(n)
+        phi = np.zeros(n)
+        target = np.full(n, -1, np.int64)
+
+        depart = self.age > self.max_age
+        starve = ~depart & (self.energy <= 0)
+        decision[depart] = DEPART
+        decision[starve] = STARVE
+        active = ~(depart | starve)
+        give_birth = active & (self.gestation <= 0)
+        decision[give_birth] = GIVE_BIRTH
+        free = active & ~give_birth
+
+        # the same desires as Critter.decide; the first of equal desires wins, as with its stable sort
+        # with no predators among default critters, choosing to flee means idling
+        max_age = self._kind_attr('MAX_AGE')
+        adult = self.age > self._bio_eval(np.arange(n), lambda bio, c: bio.adult_age(c))
+        can_mate = adult & np.isnan(self.gestation)
+        desires = np.stack(np.broadcast_arrays(
+            (self.max_energy - self.energy) / self.max_energy * self.trait('behav_weight_food'),
+            self.trait('behav_weight_wander'),
+            self.trait('behav_weight_flee'),
+            np.where(can_mate, self.age / max_age * self.trait('behav_weight_mate'), -np.inf),
+        ))
+        choice = np.where(free, np.argmax(desires, axis=0), -1)
+
+        wandering = np.flatnonzero(choice == 1)
+        decision[wandering] = WANDER
+        rho[wandering] = self.trait('wander_effort', wandering) * self.max_speed[wandering]
+        phi[wandering] = wander_phi[wandering]
+
+        foraging = np.flatnonzero(choice == 0)
+        courting = np.flatnonzero(choice == 3)
+        looking = np.concatenate([foraging, courting])
+        group = self._group()
+        profiler = self.profiler
+        critter_work, food_work = ({}, {}) if profiler is not None else (None, None)
+        seen = perception.radius_pairs(self.loc, self.loc[looking], self.trait('per_critter', looking),
+                                      exclude=looking, groups=None if group is None else (group, group[looking]),
+                                      work=critter_work)
+
+        food_seen = perception.radius_pairs(food_loc, self.loc[foraging], self.trait('per_food', foraging),
+                                           groups=None if group is None else (food_group, group[foraging]),
+                                           work=food_work)
+        if profiler is not None:
+            profiler.perceived('critters', len(seen[0]))
+            profiler.perceived('food', len(food_seen[0]))
+            profiler.batch_search('critters', len(looking), critter_work, len(seen[0]))
+            profiler.batch_search('food', len(foraging), food_work, len(food_seen[0]))
+        critters_seen = _subset(seen, np.arange(len(foraging)))
+        self._seek_food(foraging, food_seen, critters_seen, food_loc, food_amount, decision, rho, phi, target)
+
+        critters_seen = _subset(seen, np.arange(len(foraging), len(looking)), offset=len(foraging))
+        self._seek_mate(courting, critters_seen, decision, rho, phi, target)
+
+        return decision, rho, phi, target
+
+    def _seek_food(self, rows, food_seen, critters_seen, food_loc, food_amount, decision, rho, phi, target):
+        fs, fj, frho = food_seen
+        if not len(fs):
+            return
+        owner = rows[fs]
+        value = self.trait('behav_weight_food', owner) * food_amount[fj] * (self.max_energy[owner] / self.energy[owner])
+
+        # food in reach: eat the most valuable
+        near = frho <= self.reach[owner] + util.epsilon
+        best = np.flatnonzero(near)[perception.segment_first_max(fs[near], value[near])]
+        decision[owner[best]] = EAT
+        target[owner[best]] = fj[best]
+
+        # otherwise head where food is richest, net of competitors (see Critter.seek_food)
+        seeking = ~perception.segment_any(fs, near, len(rows))[fs]
+        fs, fj, frho, value = fs[seeking], fj[seeking], frho[seeking], value[seeking]
+        fphi = np.arctan2(food_loc[fj,1] - self.loc[rows[fs],1], food_loc[fj,0] - self.loc[rows[fs],0])
+
+        cs, cj, crho = critters_seen
+        cphi = np.arctan2(self.loc[cj,1] - self.loc[rows[cs],1], self.loc[cj,0] - self.loc[rows[cs],0])
+
+        # per-pair pieces of the desire formula
+        food_offset = self.trait('nav_angleoffset_food', rows)[fs]
+        food_dist = frho / self.trait('nav_distance_food', rows)[fs]
+        comp_offset = self.trait('nav_angleoffset_competitor', rows)[cs]
+        comp_dist = crho / self.trait('nav_distance_competitor', rows)[cs]
+        competition = self.trait('behav_weight_competitor', rows)[cs]
+
+        desire = np.zeros(len(fs))
+        food_counts = np.bincount(fs, minlength=len(rows))
+        work = food_counts * (food_counts + np.bincount(cs, minlength=len(rows)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for block in perception.blocks(work, perception.BLOCK):
+                cands = np.arange(*np.searchsorted(fs, [block.start, block.stop]))
+                comps = np.arange(*np.searchsorted(cs, [block.start, block.stop]))
+
+                # summing value of food in each candidate direction
+                a, b = perception.cross_segments(fs[cands], fs[cands], len(rows))
+                a, b = cands[a], cands[b]
+                terms = value[b] / (util.angles(fphi[a], fphi[b])/food_offset[b] + food_dist[b])
+                desire += np.bincount(a, weights=terms, minlength=len(fs))
+
+                # subtracting value of competitors in each candidate direction
+                a, k = perception.cross_segments(fs[cands], cs[comps], len(rows))
+                a, k = cands[a], comps[k]
+                terms = competition[k] / (util.angles(fphi[a], cphi[k])/comp_offset[k] + comp_dist[k])
+                desire -= np.bincount(a, weights=terms, minlength=len(fs))
+
+        best = perception.segment_first_max(fs, desire)
+        best = best[desire[best] > 0]
+        owner = rows[fs[best]]
+        decision[owner] = SEEK_FOOD
+        rho[owner] = frho[best] - self.reach[owner]
+        phi[owner] = fphi[best]
+
+    def _seek_mate(self, rows, critters_seen, decision, rho, phi, target):
+        cs, cj, crho = critters_seen
+        owner = rows[cs]
+        adult = self.age[cj] > self._bio_eval(cj, lambda bio, c: bio.adult_age(c))
+        valid = (self.kind[cj] == self.kind[owner]) & adult & np.isnan(self.gestation[cj])
+        cs, cj, crho, owner = cs[valid], cj[valid], crho[valid], owner[valid]
+
+        # mate in reach: every mate is valued equally, so take the first
+        near = crho <= self.reach[owner] + util.epsilon
+        best = np.flatnonzero(near)[perception.segment_first_max(cs[near], np.zeros(near.sum()))]
+        decision[owner[best]] = BREED_SEX
+        target[owner[best]] = cj[best]
+
+        seeking = ~perception.segment_any(cs, near, len(rows))[cs]
+        cs, cj, crho, owner = cs[seeking], cj[seeking], crho[seeking], owner[seeking]
+        with np.errstate(divide='ignore'):
+            desire = self.trait('behav_weight_mate', owner) / (crho / self.trait('nav_distance_mate', owner))
+        best = perception.segment_first_max(cs, desire)
+        best = best[desire[best] > 0]
+        owner = owner[best]
+        decision[owner] = SEEK_MATE
+        rho[owner] = crho[best] - self.reach[owner]
+        phi[owner] = np.arctan2(self.loc[cj[best],1] - self.loc[owner,1], self.loc[cj[best],0] - self.loc[owner,0])
+
+    def _resolve(self, decision, rho, phi, target, foods, food_amount):
+        n = self.n
+        result = np.full(n, SUCCESS, np.int8)
+        self._move_rows(np.flatnonzero(np.isin(decision, MOVES)), rho, phi)
+
+        # eating; when several critters eat the same food, bites are taken in a random turn order
+        eating = np.flatnonzero(decision == EAT)
+        if len(eating):
+            turn_order = np.empty(n, np.int64)
+            turn_order[self.order_rng.permutation(n)] = np.arange(n)
+            eating = eating[np.lexsort((turn_order[eating], target[eating]))]
+            bite = _bites(target[eating], self.max_energy[eating] - self.energy[eating], turn_order[eating], food_amount)
+            self._feed(eating, bite)
+            self._bite_food(foods, target[eating], bite)
+
+        # breeding succeeds when both critters chose each other
+        courting = np.flatnonzero(decision == BREED_SEX)
+        mate = target[courting]
+        mutual = (decision[mate] == BREED_SEX) & (target[mate] == courting)
+        result[courting[~mutual]] = FAILURE
+        self._breed(courting[mutual], mate[mutual])
+
+        births = self._births(np.flatnonzero(decision == GIVE_BIRTH))
+
+        self.last_decision = decision
+        self.last_result = result
+        self._keep((decision != DEPART) & (decision != STARVE))
+        self._append(births)
+        self.avail_food.compact()
+        if self.food is not None:
+            self.food.compact()
+
+    def _group(self):
+        # which separate world each row lives in, if there is more than one
+        return None
+
+    def _move_rows(self, rows, rho, phi):
+        dist = np.minimum(rho[rows], self.max_speed[rows])
+        self.energy[rows] -= self._bio_eval(rows, lambda bio, c: bio.move_cost(c, dist[c.group]))
+        self.loc[rows] += np.column_stack([dist*np.cos(phi[rows]), dist*np.sin(phi[rows])])
+        self.heading[rows] = phi[rows]
+
+    def _feed(self, rows, bite):
+        self.energy[rows] = np.minimum(self.energy[rows] + bite, self.max_energy[rows])
+
+    def _breed(self, parents, mates):
+        self.energy[parents] -= self._bio_eval(parents, lambda bio, c: bio.repro_cost(c))
+        for kind in np.unique(self.kind[parents]).tolist():
+            group = self.kind[parents] == kind
+            cols = self._genome_cols(kind)
+            children = self.kinds[kind].SCHEMA.crossover(self.traits[np.ix_(parents[group], cols)],
+                                                         self.traits[np.ix_(mates[group], cols)], self.mutation_rng)
+            self.embryo[np.ix_(parents[group], cols)] = children
+        self.gestation[parents] = self._bio_eval(parents, lambda bio, c: bio.gestation_period(c))
+
+    def _births(self, parents):
+        children = self._blank(len(parents))
+        donation = np.minimum(self.energy[parents], self.trait('energy_inheritance', parents) * self.max_energy[parents])
+        self.energy[parents] -= donation
+        for kind in np.unique(self.kind[parents]).tolist():
+            group = self.kind[parents] == kind
+            genomes = self.embryo[np.ix_(parents[group], self._genome_cols(kind))]
+            stats = self.bios[kind].derive_batch(self.kinds[kind], genomes, self)
+            for col, name in enumerate(BioAssumptions.STATS):
+                children[name][group] = stats[:, col]
+            children['max_age'][group] = self.kinds[kind].MAX_AGE
+        children['kind'][:] = self.kind[parents]
+        children['loc'][:] = self.loc[parents]
+        children['energy'][:] = np.minimum(donation, children['max_energy'])
+        children['heading'][:] = self.placement_rng.uniform(-pi, pi, len(parents))
+        children['generation'][:] = self.generation[parents] + 1
+        children['birth'][:] = self.turn
+        children['traits'][:] = self.embryo[parents]
+        self.embryo[parents] = np.nan
+        self.gestation[parents] = np.nan
+        return children
+
+    def population_summary(self):
+        if not self.n:
+            return {'pop': 0}
+        return {
+            'pop': self.n,
+            'avg_age': self.age.mean(),
+            'avg_generation': self.generation.mean(),
+            'max_generation': int(self.generation.max()),
+            'avg_energy': self.energy.mean(),
+        }
+
+    def report(self):
+        for kind, Species in enumerate(self.kinds):
+            print(f"\n{Species.__name__}")
+            extant = self.kind == kind
+            if extant.any():
+                for trait in Species.START_TRAITS:
+                    print(f"\t{trait}: {self.trait(trait, extant).mean():.2f}")
+            else:
+                print("No surviving critters")
+
+
+class CritterView:
+    '''
+        Read-only stand-in for a Critter living in an ArrayWorld, built on demand from the world's columns
+    '''
+    FIELDS = {
+        'energy': 'energy', 'age': 'age', 'max_age': 'max_age', 'generation': 'generation', 'birth': 'birth',
+        'reach': 'reach', 'max_speed': 'max_speed', 'max_energy': 'max_energy',
+        'metabolic_upkeep': 'metabolic_upkeep', 'last_heading': 'heading',
+    }
+
+    def __init__(self, world, critter_id):
+        self.world = world
+        self.id = critter_id
+
+    @property
+    def _row(self):
+        return self.world.row_of(self.id)
+
+    @property
+    def species(self):
+        return self.world.kinds[self.world.kind[self._row]]
+
+    @property
+    def bio(self):
+        return self.world.bios[self.world.kind[self._row]]
+
+    @property
+    def loc(self):
+        x,y = self.world.loc[self._row].tolist()
+        return (x,y)
+
+    @property
+    def gestation_timer(self):
+        timer = self.world.gestation[self._row]
+        return None if np.isnan(timer) else int(timer)
+
+    @property
+    def traits(self):
+        row = self.world.traits[self._row]
+        return {t: float(row[self.world.trait_idx[t]]) for t in self.species.START_TRAITS}
+
+    @property
+    def last_decision(self):
+        return Decisions(self.world.last_decision[self._row])
+
+    @property
+    def last_result(self):
+        return Results(self.world.last_result[self._row])
+
+    def __getattr__(self, name):
+        world = self.__dict__['world']
+        if name in self.FIELDS:
+            return getattr(world, self.FIELDS[name])[self._row].item()
+        if name in world.trait_idx:
+            return world.traits[self._row, world.trait_idx[name]].item()
+        raise AttributeError(name)
+
+    def __eq__(self, other):
+        return isinstance(other, CritterView) and other.world is self.world and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<{self.species.__name__} #{self.id}>"
+
+
+def _bites(food, hunger, order, food_amount):
+    # how much each eater gets when the eaters of each food take turns (lowest order first) until it runs out
+    sort = np.lexsort((order, food))
+    food, hunger = food[sort], hunger[sort]
+    eaten_before = np.cumsum(hunger) - hunger
+    eaten_before -= eaten_before[np.searchsorted(food, food)]
+    bite = np.empty(len(sort))
+    bite[sort] = np.clip(food_amount[food] - eaten_before, 0, hunger)
+    return bite
+
+
+def _decide_tile(state, owned, food_loc, food_amount, wander_phi):
+    # runs in a pool worker: the decisions of a tile's own critters, from a bare world holding the tile and its halo
+    world = ArrayWorld.__new__(ArrayWorld)
+    vars(world).update(state)
+    decision, rho, phi, target = world._decide(food_loc, food_amount, wander_phi)
+    return decision[owned], rho[owned], phi[owned], target[owned]
+
+
+class _Columns:
+    # a group of same-species critters with array-valued traits, for BioAssumptions formulas
+    # that only do arithmetic on critter attributes
+    def __init__(self, world, kind, rows, group):
+        self.world = world
+        self.MAX_AGE = world.kinds[kind].MAX_AGE
+        self.rows = rows
+        self.group = group      # where these rows sit in the array being evaluated
+
+    def __getattr__(self, name):
+        world = self.__dict__['world']
+        if name in world.trait_idx:
+            return world.trait(name, self.rows)
+        if name in CritterView.FIELDS:
+            return getattr(world, CritterView.FIELDS[name])[self.rows]
+        raise AttributeError(name)
+
+
+def _subset(pairs, centers, offset=0):
+    # pairs of the given (consecutive) centers, renumbered from 0
+    ci, pj, rho = pairs
+    lo, hi = np.searchsorted(ci, [centers[0], centers[-1]+1]) if len(centers) else (0, 0)
+    return ci[lo:hi] - offset, pj[lo:hi], rho[lo:hi]
+
+
+def run(start_pop=50000, turns=20, seed=None, food_field=True):
+    # benchmark on a world scaled up to keep the default critter density
+    class BigWorld(ArrayWorld):
+        SIZE = int(World.SIZE * (start_pop / 50) ** 0.5)
+
+    world = BigWorld(size=BigWorld.SIZE, seed=seed, food_field=food_field)
+    world.abundance = .6
+    world.set_up_food()
+    world.populate(Critter, start_pop, ages=world.placement_rng.integers(0, Critter.MAX_AGE, start_pop, endpoint=True))
+
+    start = perf_counter()
+    while world.turn < turns and 0 < (turn_pop := world.pop_count):
+        print(f"{world.turn}: {turn_pop}")
+        world.step()
+    print(f"{world.turn / (perf_counter() - start):.2f} turns/sec")
+    world.report()
+
+if __name__=='__main__':
+    run()
@@ -0,0 +1,148 @@
+from world import World
+from arrayworld import ArrayWorld
+from critter import Critter
+from biology import BioAssumptions
+
+import numpy as np
+from time import perf_counter
+
+
+class BatchWorld(ArrayWorld):
+    '''
+        Many independent replicas of the same world, advanced together so every turn is one pass of the
+        vectorized ArrayWorld rules rather than one per replica.
+        Populations differ between replicas, so rather than padding every column to (replicas, max population)
+        the replicas' rows are stacked in the same columns with a replica column saying whose they are;
+        perception never pairs rows of different replicas. Food is kept in a FoodField grouped by replica,
+        so resource fields aren't supported.
+        The replicas share the world's random streams, so replica b is not the same run as
+        ArrayWorld(seed=b), just an independent one.
+    '''
+
+    COLUMNS = ArrayWorld.COLUMNS + ('replica',)
+
+    def __init__(self, replicas, size=World.SIZE, food_drops=None, seed=None):
+        super().__init__(size, food_drops, seed, food_field=True)
+        self.replicas = replicas
+
+    def _blank(self, n):
+        columns = super()._blank(n)
+        columns['replica'] = np.zeros(n, np.int64)
+        return columns
+
+    def _group(self):
+        return self.replica
+
+    # PER-REPLICA SUMMARIES, each an array with one entry per replica
+
+    def replica_pop(self):
+        return np.bincount(self.replica, minlength=self.replicas)
+
+    def replica_food(self):
+        return self.food.energy(self.replicas)
+
+    def replica_mean(self, name, kind=None):
+        # mean of a column or trait in each replica (NaN where a replica has no critters of that kind)
+        rows = slice(None) if kind is None else self.kind == kind
+        values = self.trait(name, rows) if name in self.trait_idx else getattr(self, name)[rows]
+        replica = self.replica[rows]
+        with np.errstate(invalid='ignore'):
+            return (np.bincount(replica, weights=values, minlength=self.replicas)
+                    / np.bincount(replica, minlength=self.replicas))
+
+    # CRITTERS
+
+    def _check_replica(self, replica):
+        if not 0 <= replica < self.replicas:
+            raise ValueError(f"no replica {replica} among {self.replicas}")
+
+    def add_critter(self, critter, replica=0):
+        self.add_critters([critter], replica)
+
+    def add_critters(self, critters, replica=0):
+        # all into the one replica
+        self._check_replica(replica)
+        start = self.n
+        super().add_critters(critters)
+        self.replica[start:] = replica
+
+    def populate(self, Species, count, bio=BioAssumptions, ages=None, replica=None):
+        # *count* critters in every replica, or only in *replica*;
+        # ages may be given per replica (count) or for all of them (count*replicas)
+        if replica is not None:
+            self._check_replica(replica)
+            super().populate(Species, count, bio, ages)
+            self.replica[self.n - count:] = replica
+            return
+        if ages is not None and len(ages) == count:
+            ages = np.tile(ages, self.replicas)
+        super().populate(Species, count * self.replicas, bio, ages)
+        self.replica[self.n - count*self.replicas:] = np.repeat(np.arange(self.replicas), count)
+
+    def _births(self, parents):
+        children = super()._births(parents)
+        children['replica'][:] = self.replica[parents]
+        return children
+
+    # FOOD
+
+    def drop_food(self):
+        for drop in self.food_drops:
+            adjusted_mean = self.drop_mean(drop)
+            counts = self.food_rng.normal(adjusted_mean, adjusted_mean*drop.cv, self.replicas)
+            counts = np.maximum(0, np.round(counts)).astype(np.int64)
+            self.food.spawn(self.drop_locs(drop, counts.sum()), drop.food.DEFAULT_AMOUNT,
+                            np.repeat(np.arange(self.replicas), counts))
+
+    # ADMIN
+
+    def step(self):
+
+        self.turn += 1
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start(self.turn)
+
+        self.expire_food()
+        if profiler is not None:
+            profiler.lap('food')
+        self.drop_food()
+        if profiler is not None:
+            profiler.lap('drop_food')
+
+        self.age += 1
+        self.gestation -= 1
+
+        wander_phi = self.wander_rng.vonmises(self.heading, self.trait('wander_faith'))
+        foods, food_loc, food_amount, food_replica = self._food_columns()
+        decision, rho, phi, target = self._decide(food_loc, food_amount, wander_phi, food_replica)
+        if profiler is not None:
+            profiler.count_decision_values(decision)
+            profiler.lap('decide')
+        self._resolve(decision, rho, phi, target, foods, food_amount)
+        if profiler is not None:
+            profiler.lap('resolve')
+            profiler.end()
+
+    def report(self):
+        pop = self.replica_pop()
+        print(f"\npopulation over {self.replicas} replicas: mean {pop.mean():.1f}, sd {pop.std():.1f}, "
+              f"min {pop.min()}, max {pop.max()}, extinct {np.count_nonzero(pop == 0)}")
+        super().report()
+
+
+def run(replicas=1000, start_pop=50, turns=100, seed=None):
+    # a Monte Carlo batch of default worlds
+    world = BatchWorld(replicas, seed=seed)
+    world.abundance = .6
+    world.set_up_food()
+    world.populate(Critter, start_pop, ages=world.placement_rng.integers(0, Critter.MAX_AGE, start_pop, endpoint=True))
+
+    start = perf_counter()
+    while world.turn < turns and world.pop_count > 0:
+        world.step()
+    print(f"{world.turn / (perf_counter() - start):.2f} turns/sec for {replicas} replicas")
+    world.report()
+
+if __name__=='__main__':
+    run()
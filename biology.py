@@ -1,11 +1,31 @@
 import util
 
-from math import log
+import numpy as np
+from types import SimpleNamespace
 
 class BioAssumptions:
 
     DESCRIPTION = "The default biological assumptions"
 
+    # the derive_* formulas are written so *critter* can also stand for many critters at once,
+    # with array-valued traits (see derive_batch)
+    STATS = ('reach', 'max_speed', 'max_energy', 'metabolic_upkeep')
+
+    @classmethod
+    def derive_stats(cls, critter):
+        return (cls.derive_reach(critter), cls.derive_max_speed(critter),
+                cls.derive_max_energy(critter), cls.derive_metabolic_upkeep(critter))
+
+    @classmethod
+    def derive_batch(cls, Species, genomes, world):
+        # derived stats of many critters from their genomes (rows in Species.SCHEMA order),
+        # as an array with one column per stat in STATS order
+        genomes = np.asarray(genomes, dtype=float).reshape(-1, len(Species.SCHEMA))
+        critters = SimpleNamespace(world=world, MAX_AGE=Species.MAX_AGE,
+                                   **{trait: genomes[:,i] for i, trait in enumerate(Species.SCHEMA.names)})
+        stats = np.broadcast_arrays(np.zeros(len(genomes)), *cls.derive_stats(critters))[1:]
+        return np.column_stack(stats)
+
     @classmethod
     def derive_reach(cls, critter):
         # mass ~ length^3, reach is about half of length
@@ -20,7 +40,7 @@ class BioAssumptions:
         # https://www.sciencemag.org/news/2017/07/why-midsized-animals-are-fastest-earth
         # https://www.wolframalpha.com/input/?i=plot+%28-2%2F27%29x%5E3+-+%281%2F3%29x%5E2+%2B+%2817%2F9%29x+%2B+%28220%2F27%29
         # 1kg = 35 mass, 50km/hr = 10 speed
-        x = log(critter.mass/35)/log(10)
+        x = np.log(critter.mass/35)/np.log(10)
         speed = (-1/1350)*x**3 - (1/300)*x**2 + (17/900)*x + (11/135)
         return speed * critter.world.TURN_DURATION
 
@@ -37,7 +57,7 @@ class BioAssumptions:
     @classmethod
     def repro_cost(cls, critter):
         # currently a flat proportion of max energy
-        return 0.05 * cls.derive_max_energy(critter)
+        return 0.05 * critter.max_energy
 
     @classmethod
     def adult_age(cls, critter):
@@ -0,0 +1,259 @@
+from arrayworld import ArrayWorld
+from batchworld import BatchWorld
+from critter import Decisions, Results
+from biology import BioAssumptions
+from resourcefield import ResourceField
+from drops import FoodDrop, Fertility
+
+import numpy as np
+import json
+import os
+from importlib import import_module
+from inspect import isroutine
+
+# Checkpoints are .npz files of plain arrays, loaded with allow_pickle=False. Classes (species, biological
+# assumptions, food, the world itself) are stored by import path, so they must be importable when loading.
+
+RNGS = ('order_rng', 'wander_rng', 'mutation_rng', 'food_rng', 'placement_rng')
+STATS = BioAssumptions.STATS
+
+
+def save(world, path):
+    # written to a temporary file first, so a crash mid-save leaves any previous checkpoint intact
+    arrays = {'meta': _meta(world), **_food_columns(world)}
+    for k, drop in enumerate(world.food_drops):
+        if drop.fertility is not None:
+            arrays[f'fertility_{k}'] = drop.fertility.grid
+    if world.resources is not None:
+        arrays['resource_grid'] = world.resources.grid
+    if isinstance(world, ArrayWorld):
+        arrays.update(_array_columns(world))
+    else:
+        arrays.update(_critter_columns(world))
+    temp = f"{path}.tmp"
+    with open(temp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp, path)
+
+
+def load(path):
+    with np.load(path, allow_pickle=False) as saved:
+        arrays = dict(saved)
+    meta = json.loads(str(arrays['meta']))
+    World_class = _resolve(meta['world'])
+    seed = np.random.SeedSequence(meta['entropy'], spawn_key=meta['spawn_key'])
+    food_drops = [FoodDrop(_resolve(food), mu, cv,
+                           Fertility(arrays[f'fertility_{k}'], meta['size']) if f'fertility_{k}' in arrays else None,
+                           None if season is None else _resolve(season['class'])(**season['settings']))
+                  for k, (food, mu, cv, season) in enumerate(meta['food_drops'])]
+    if issubclass(World_class, BatchWorld):
+        world = World_class(meta['replicas'], size=meta['size'], food_drops=food_drops, seed=seed)
+    elif issubclass(World_class, ArrayWorld):
+        world = World_class(size=meta['size'], food_drops=food_drops, seed=seed, food_field=meta['food_field'])
+    else:
+        world = World_class(size=meta['size'], food_drops=food_drops, seed=seed)
+    world.turn = meta['turn']
+    world.abundance = meta['abundance']
+    # before anything is added, so the chunks fill up in the same order as they did in the saved world
+    critter_chunks, food_chunks = meta['chunk_sizes']
+    world.critters.rebucket(critter_chunks)
+    world.avail_food.rebucket(food_chunks)
+
+    _restore_food(world, arrays)
+    if meta['resources'] is not None:
+        world.resources = ResourceField(**meta['resources'])
+        world.resources.grid = arrays['resource_grid']
+    if isinstance(world, ArrayWorld):
+        _restore_array_columns(world, meta, arrays)
+    else:
+        _restore_critters(world, arrays)
+    # last, since rebuilding critters draws from them
+    for name in RNGS:
+        getattr(world, name).bit_generator.state = meta['rngs'][name]
+    return world
+
+
+class Checkpointer:
+    '''
+        Steps a world and saves it every *every* turns; use step() in place of world.step().
+        A crashed run picks up from the last checkpoint with Checkpointer.resume(path).
+    '''
+    def __init__(self, world, path, every=100):
+        self.world = world
+        self.path = path
+        self.every = every
+
+    @classmethod
+    def resume(cls, path, every=100):
+        return cls(load(path), path, every)
+
+    def step(self):
+        self.world.step()
+        if self.world.turn % self.every == 0:
+            save(self.world, self.path)
+
+
+# SAVING
+
+def _name(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+def _resolve(name):
+    module, _, qualname = name.partition(':')
+    thing = import_module(module)
+    for attr in qualname.split('.'):
+        thing = getattr(thing, attr)
+    return thing
+
+def _field(world):
+    # the world's FoodField, if it keeps its food in one
+    return world.food if isinstance(world, ArrayWorld) else None
+
+def _season(season):
+    # seasons are stored as their class and settings, so they have to be instances of a class (e.g. drops.Seasons)
+    if season is None:
+        return None
+    if isroutine(season) or not hasattr(season, '__dict__'):
+        raise TypeError(f"can't checkpoint the season {season!r}; use a class like drops.Seasons or drops.Curve")
+    return {'class': _name(type(season)), 'settings': vars(season)}
+
+def _resource_settings(field):
+    return {name: getattr(field, name) for name in ('size', 'resolution', 'capacity', 'regrow', 'diffusion', 'decay')}
+
+def _meta(world):
+    meta = {
+        'world': _name(type(world)),
+        'size': world.size,
+        'turn': world.turn,
+        'abundance': world.abundance,
+        'chunk_sizes': [world.critters.chunk_size, world.avail_food.chunk_size],
+        'resources': None if world.resources is None else _resource_settings(world.resources),
+        'food_drops': [(_name(drop.food), drop.mu, drop.cv, _season(drop.season)) for drop in world.food_drops],
+        'entropy': world.seed.entropy,
+        'spawn_key': list(world.seed.spawn_key),
+        'rngs': {name: getattr(world, name).bit_generator.state for name in RNGS},
+    }
+    if isinstance(world, BatchWorld):
+        meta['replicas'] = world.replicas
+    if isinstance(world, ArrayWorld):
+        meta.update(kinds=[_name(Species) for Species in world.kinds], bios=[_name(bio) for bio in world.bios],
+                    trait_names=world.trait_names, next_id=world.next_id, food_field=world.food is not None)
+    return np.array(json.dumps(meta))
+
+def _food_columns(world):
+    if _field(world) is not None:
+        field = world.food
+        return {'food_loc': field.loc, 'food_amount': field.amount, 'food_original': field.original,
+                'food_group': field.group}
+    foods = world.all_food
+    types = list(dict.fromkeys(type(f) for f in foods))
+    return {
+        'food_types': np.array([_name(t) for t in types], dtype=str),
+        'food_type': np.array([types.index(type(f)) for f in foods], dtype=np.int64),
+        'food_loc': np.array([f.loc for f in foods], dtype=float).reshape(-1, 2),
+        'food_amount': np.array([f._amount for f in foods], dtype=float),     # as of food_since, see Food.anchor
+        'food_since': np.array([f._since for f in foods], dtype=np.int64),
+        'food_original': np.array([f.original_amount for f in foods], dtype=float),
+    }
+
+def _array_columns(world):
+    return {f'col_{name}': getattr(world, name) for name in world.COLUMNS}
+
+def _critter_columns(world):
+    # the critters in roster order, so chunks fill back up in the same order and a resumed run matches
+    critters = world.all_critters
+    species = list(dict.fromkeys(type(c) for c in critters))
+    bios = list(dict.fromkeys(c.bio for c in critters))
+    trait_names = list(dict.fromkeys(t for Species in species for t in Species.SCHEMA.names))
+    cols = {Species: [trait_names.index(t) for t in Species.SCHEMA.names] for Species in species}
+
+    genomes = np.full((len(critters), len(trait_names)), np.nan)
+    embryo_owner, embryos, embryo_stats = [], [], []
+    for row, c in enumerate(critters):
+        genomes[row, cols[type(c)]] = c.genome
+        for genome, derived in c.offspring_genomes:
+            embryo = np.full(len(trait_names), np.nan)
+            embryo[cols[type(c)]] = genome
+            embryo_owner.append(row)
+            embryos.append(embryo)
+            embryo_stats.append(np.full(len(STATS), np.nan) if derived is None else derived)
+
+    def column(attr, dtype=float):
+        return np.array([getattr(c, attr) for c in critters], dtype=dtype)
+
+    return {
+        'species': np.array([_name(Species) for Species in species], dtype=str),
+        'bios': np.array([_name(bio) for bio in bios], dtype=str),
+        'trait_names': np.array(trait_names, dtype=str),
+        'kind': np.array([species.index(type(c)) for c in critters], dtype=np.int64),
+        'bio': np.array([bios.index(c.bio) for c in critters], dtype=np.int64),
+        'loc': np.array([c.loc for c in critters], dtype=float).reshape(-1, 2),
+        'energy': column('energy'),
+        'age': column('age', np.int64),
+        'max_age': column('max_age', np.int64),
+        'gestation': np.array([np.nan if c.gestation_timer is None else c.gestation_timer for c in critters]),
+        'heading': column('last_heading'),
+        'generation': column('generation', np.int64),
+        'birth': column('birth', np.int64),
+        'derived': np.array([[getattr(c, stat) for stat in STATS] for c in critters]).reshape(-1, len(STATS)),
+        'genomes': genomes,
+        'embryo_owner': np.array(embryo_owner, dtype=np.int64),
+        'embryos': np.array(embryos).reshape(-1, len(trait_names)),
+        'embryo_stats': np.array(embryo_stats).reshape(-1, len(STATS)),
+        'last_decision': np.array([c.last_decision.value for c in critters], dtype=np.int64),
+        'last_result': np.array([c.last_result.value for c in critters], dtype=np.int64),
+    }
+
+
+# RESTORING
+
+def _restore_food(world, arrays):
+    if _field(world) is not None:
+        world.food.spawn(arrays['food_loc'], arrays['food_original'], arrays['food_group'])
+        world.food.set_amounts(arrays['food_amount'])
+        return
+    types = [_resolve(name) for name in arrays['food_types'].tolist()]
+    for kind, loc, amount, since, original in zip(arrays['food_type'].tolist(), arrays['food_loc'].tolist(),
+                                                  arrays['food_amount'].tolist(), arrays['food_since'].tolist(),
+                                                  arrays['food_original'].tolist()):
+        food = types[kind](world, amount=original, loc=tuple(loc))
+        food.anchor(amount, since)
+        world.avail_food.add(food, food.loc)
+
+def _restore_array_columns(world, meta, arrays):
+    world.kinds = [_resolve(name) for name in meta['kinds']]
+    world.bios = [_resolve(name) for name in meta['bios']]
+    world.trait_names = list(meta['trait_names'])
+    world.trait_idx = {t: i for i, t in enumerate(world.trait_names)}
+    world.next_id = meta['next_id']
+    world.species.update(world.kinds)
+    for name in world.COLUMNS:
+        setattr(world, name, arrays[f'col_{name}'])
+    world._rows = None
+
+def _restore_critters(world, arrays):
+    species = [_resolve(name) for name in arrays['species'].tolist()]
+    bios = [_resolve(name) for name in arrays['bios'].tolist()]
+    trait_names = arrays['trait_names'].tolist()
+    cols = {Species: [trait_names.index(t) for t in Species.SCHEMA.names] for Species in species}
+
+    embryos = {}
+    for owner, embryo, stats in zip(arrays['embryo_owner'].tolist(), arrays['embryos'], arrays['embryo_stats']):
+        embryos.setdefault(owner, []).append((embryo, None if np.isnan(stats).all() else stats))
+
+    critters = []
+    for row, kind in enumerate(arrays['kind'].tolist()):
+        Species = species[kind]
+        c = Species(world, energy=float(arrays['energy'][row]), loc=tuple(arrays['loc'][row].tolist()),
+                    age=int(arrays['age'][row]), max_age=int(arrays['max_age'][row]), bio=bios[arrays['bio'][row]],
+                    generation=int(arrays['generation'][row]), genome=arrays['genomes'][row, cols[Species]],
+                    derived=arrays['derived'][row])
+        gestation = arrays['gestation'][row]
+        c.gestation_timer = None if np.isnan(gestation) else int(gestation)
+        c.birth = int(arrays['birth'][row])
+        c.last_heading = float(arrays['heading'][row])
+        c.last_decision = Decisions(int(arrays['last_decision'][row]))
+        c.last_result = Results(int(arrays['last_result'][row]))
+        c.offspring_genomes = [(embryo[cols[Species]], stats) for embryo, stats in embryos.get(row, [])]
+        critters.append(c)
+    world.add_critters(critters)
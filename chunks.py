@@ -0,0 +1,309 @@
+from perception import concat_ranges
+
+import numpy as np
+
+CHUNK_COST = 2      # cost of visiting a chunk in a search, relative to scanning one thing in it
+
+
+def best_chunk_size(size, count, radii, smallest=1):
+    # the chunk side minimizing the expected cost of searches of the given radii among *count* things spread over
+    # a size*size world. A search of radius r overlaps about (2r/s + 1)**2 chunks of side s, which hold about
+    # density * (2r + s)**2 things; visiting ever smaller chunks would scan the fewest things, so the chunk
+    # visits are what keeps s from shrinking to nothing. Only occupied chunks are ever visited, at most count of them
+    radii = np.asarray(radii, dtype=float)
+    radii, queries = np.unique(np.minimum(radii[~np.isnan(radii)], size), return_counts=True)
+    if not len(radii):
+        return size
+    sides = np.geomspace(smallest, size, 64)
+    per_side = np.floor(size / sides) + 1
+    chunks = np.minimum((2*radii[:,None] / sides + 1)**2, np.minimum(per_side**2, count))
+    scanned = np.minimum(count / size**2 * (2*radii[:,None] + sides)**2, count)
+    cost = queries @ (CHUNK_COST*chunks + scanned)
+    return float(sides[np.argmin(cost)])
+
+
+class ChunkMap:
+    '''
+        Things (critters or food) bucketed by square chunks of the world, for range searches.
+        Each chunk is an insertion-ordered dict used as a set, so adding, moving and removing are O(1).
+        Only occupied chunks are kept: they're created by the first thing added to them and dropped once empty,
+        so memory scales with what's in the world rather than its area, and searches spanning more chunks than
+        are occupied go through the occupied ones instead of the span.
+        Removals are only tombstoned until compact() is called, normally once at the end of World.step.
+        The live count is kept up to date, and the flat roster of live things is cached until membership
+        (or a thing's chunk) changes.
+    '''
+    def __init__(self, size, chunk_size):
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunks = {}    # (x,y) -> things, occupied chunks only
+        self.dead = {}      # removed things -> the chunk they're still physically in
+        self.count = 0
+        self._roster = None
+        self._keys = None   # occupied chunks in (x,y) order, cached until one is created or dropped
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.roster)
+
+    @property
+    def roster(self):
+        # live things, chunk by chunk in (x,y) order
+        if self._roster is None:
+            self._roster = tuple(thing for idx in self.keys for thing in self._live(self.chunks[idx]))
+        return self._roster
+
+    @property
+    def keys(self):
+        if self._keys is None:
+            self._keys = sorted(self.chunks)
+        return self._keys
+
+    def __contains__(self, thing):
+        return thing not in self.dead and any(thing in chunk for chunk in self.chunks.values())
+
+    def _live(self, chunk):
+        if not self.dead:
+            return chunk
+        return [thing for thing in chunk if thing not in self.dead]
+
+    def chunk_normalize(self, coord):
+        coord = max(0, min(self.size, coord))
+        return int(coord/self.chunk_size)
+
+    def chunk_idx(self, loc):
+        x,y = loc
+        return self.chunk_normalize(x), self.chunk_normalize(y)
+
+    def _file(self, thing, idx):
+        chunk = self.chunks.get(idx)
+        if chunk is None:
+            chunk = self.chunks[idx] = {}
+            self._keys = None
+        chunk[thing] = None
+
+    def _unfile(self, thing, idx):
+        chunk = self.chunks.get(idx)
+        if chunk is None:
+            return
+        chunk.pop(thing, None)
+        if not chunk:
+            del self.chunks[idx]
+            self._keys = None
+
+    def add(self, thing, loc):
+        self._file(thing, self.chunk_idx(loc))
+        self.count += 1
+        self._roster = None
+
+    def move(self, thing, old_loc, new_loc):
+        # a thing moving within its chunk keeps its place in the chunk's order; one changing chunks goes last
+        old_idx = self.chunk_idx(old_loc)
+        new_idx = self.chunk_idx(new_loc)
+        if old_idx != new_idx:
+            self._unfile(thing, old_idx)
+            self._file(thing, new_idx)
+            self._roster = None
+
+    def remove(self, thing, loc):
+        # safe to call more than once for the same thing
+        if thing not in self.dead:
+            self.dead[thing] = self.chunk_idx(loc)
+            self.count -= 1
+            self._roster = None
+
+    def compact(self):
+        for thing, idx in self.dead.items():
+            self._unfile(thing, idx)
+        self.dead = {}
+
+    def rebucket(self, chunk_size):
+        # re-files every live thing (by its .loc) into chunks of the new size
+        things = self.roster
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        self.dead = {}
+        for thing in things:
+            self._file(thing, self.chunk_idx(thing.loc))
+        self._roster = None
+        self._keys = None
+
+    def span(self, loc, search_range):
+        # (left, right, down, up) chunk indices of the square around loc
+        x,y = loc
+        return (self.chunk_normalize(x-search_range), self.chunk_normalize(x+search_range),
+                self.chunk_normalize(y-search_range), self.chunk_normalize(y+search_range))
+
+    def chunks_spanned(self, loc, search_range):
+        # the chunks a search visits: those in the span, or the occupied ones if there are fewer of them
+        left_idx, right_idx, down_idx, up_idx = self.span(loc, search_range)
+        return min((right_idx-left_idx+1) * (up_idx-down_idx+1), len(self.chunks))
+
+    def search(self, loc, search_range):
+        # live things in every chunk overlapping the square around loc, in roster order
+        left_idx, right_idx, down_idx, up_idx = self.span(loc, search_range)
+        chunks = self.chunks
+        if (right_idx-left_idx+1) * (up_idx-down_idx+1) <= len(chunks):
+            spanned = [chunks[(i,j)] for i in range(left_idx, right_idx+1) for j in range(down_idx, up_idx+1)
+                            if (i,j) in chunks]
+        else:
+            spanned = [chunks[(i,j)] for i,j in self.keys if left_idx <= i <= right_idx and down_idx <= j <= up_idx]
+        return [thing for chunk in spanned for thing in self._live(chunk)]
+
+
+class FoodIndex:
+    '''
+        The same interface as ChunkMap for things that never move once added (food): rather than chunk dicts,
+        things are packed into arrays sorted by chunk, so a range search is one slice of those arrays per column
+        of chunks it spans, and the distance check on what's in them is vectorized.
+        Things added wait in a pending list until the index is next read, then are merged in all at once,
+        keeping the ChunkMap's order (chunk by chunk, in order of addition within a chunk).
+        Removals are tombstoned until compact(), as with ChunkMap.
+    '''
+    def __init__(self, size, chunk_size):
+        self.size = size
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.things = np.empty(0, dtype=object)
+        self.locs = np.zeros((0, 2))
+        self.keys = np.zeros(0, np.int64)     # chunk of each thing, x-major; sorted
+        self.ids = np.zeros(0, np.int64)
+        self.pending = []       # (thing, loc) added since the last merge
+        self.id_of = {}         # thing -> id, for things added and not yet compacted away
+        self.dead = {}          # removed things -> their id
+        self._next_id = 0
+        self._alive = None      # mask of the packed things not removed, cached until a merge or removal
+        self._roster = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.roster)
+
+    def __contains__(self, thing):
+        return thing in self.id_of and thing not in self.dead
+
+    @property
+    def roster(self):
+        if self._roster is None:
+            things, _ = self.packed()
+            self._roster = tuple(things.tolist())
+        return self._roster
+
+    def packed(self):
+        # (things, locs) of the live things, in roster order
+        self._merge()
+        alive = self.alive()
+        if alive.all():
+            return self.things, self.locs
+        return self.things[alive], self.locs[alive]
+
+    def alive(self):
+        if self._alive is None:
+            self._alive = ~np.isin(self.ids, np.fromiter(self.dead.values(), np.int64, len(self.dead)))
+        return self._alive
+
+    def chunk_normalize(self, coord):
+        coord = max(0, min(self.size, coord))
+        return int(coord/self.chunk_size)
+
+    def chunk_idx(self, loc):
+        x,y = loc
+        return self.chunk_normalize(x), self.chunk_normalize(y)
+
+    def _keys(self, locs):
+        per_side = int(self.size/self.chunk_size) + 1
+        idx = (np.clip(locs, 0, self.size) / self.chunk_size).astype(np.int64)
+        return idx[:,0] * per_side + idx[:,1]
+
+    def add(self, thing, loc):
+        self.pending.append((thing, loc))
+        self.id_of[thing] = self._next_id
+        self._next_id += 1
+        self.count += 1
+        self._roster = None
+
+    def move(self, thing, old_loc, new_loc):
+        raise TypeError("things in a FoodIndex can't move")
+
+    def remove(self, thing, loc):
+        # safe to call more than once for the same thing
+        if thing not in self.dead:
+            self.dead[thing] = self.id_of[thing]
+            self.count -= 1
+            self._alive = None
+            self._roster = None
+
+    def _merge(self):
+        if not self.pending:
+            return
+        things, locs = zip(*self.pending)
+        self.pending = []
+        new_things = np.empty(len(things), dtype=object)
+        new_things[:] = things
+        new_locs = np.array(locs, dtype=float).reshape(-1, 2)
+        new_keys = self._keys(new_locs)
+        new_ids = np.array([self.id_of[thing] for thing in things], dtype=np.int64)
+        order = np.argsort(new_keys, kind='stable')
+        at = np.searchsorted(self.keys, new_keys[order], side='right')
+        self.things = np.insert(self.things, at, new_things[order])
+        self.locs = np.insert(self.locs, at, new_locs[order], axis=0)
+        self.keys = np.insert(self.keys, at, new_keys[order])
+        self.ids = np.insert(self.ids, at, new_ids[order])
+        self._alive = None
+
+    def compact(self):
+        if not self.dead:
+            return
+        self._merge()
+        alive = self.alive()
+        for thing in self.dead:
+            del self.id_of[thing]
+        self.dead = {}
+        self.things, self.locs, self.keys, self.ids = self.things[alive], self.locs[alive], self.keys[alive], self.ids[alive]
+        self._alive = None
+
+    def rebucket(self, chunk_size):
+        self._merge()
+        self.chunk_size = chunk_size
+        keys = self._keys(self.locs)
+        order = np.argsort(keys, kind='stable')
+        self.things, self.locs, self.keys, self.ids = self.things[order], self.locs[order], keys[order], self.ids[order]
+        self._alive = None
+        self._roster = None
+
+    def span(self, loc, search_range):
+        # (left, right, down, up) chunk indices of the square around loc
+        x,y = loc
+        return (self.chunk_normalize(x-search_range), self.chunk_normalize(x+search_range),
+                self.chunk_normalize(y-search_range), self.chunk_normalize(y+search_range))
+
+    def chunks_spanned(self, loc, search_range):
+        left_idx, right_idx, down_idx, up_idx = self.span(loc, search_range)
+        return (right_idx-left_idx+1) * (up_idx-down_idx+1)
+
+    def rows(self, loc, search_range):
+        # packed rows of the live things in every chunk overlapping the square around loc, in roster order
+        self._merge()
+        left_idx, right_idx, down_idx, up_idx = self.span(loc, search_range)
+        columns = np.arange(left_idx, right_idx+1) * (int(self.size/self.chunk_size) + 1)
+        starts = np.searchsorted(self.keys, columns + down_idx, side='left')
+        ends = np.searchsorted(self.keys, columns + up_idx, side='right')
+        rows = concat_ranges(starts, ends - starts)
+        return rows[self.alive()[rows]] if self.dead else rows
+
+    def search(self, loc, search_range):
+        return self.things[self.rows(loc, search_range)].tolist()
+
+    def within(self, loc, search_range, rows=None):
+        # (distance, thing) for every live thing within search_range of loc, in roster order;
+        # rows, if given, are the search's rows found already
+        if rows is None:
+            rows = self.rows(loc, search_range)
+        x,y = loc
+        rho = np.hypot(self.locs[rows,0] - x, self.locs[rows,1] - y)
+        near = rho <= search_range
+        return list(zip(rho[near].tolist(), self.things[rows[near]].tolist()))
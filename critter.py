@@ -1,10 +1,11 @@
 import util
 from biology import BioAssumptions
+from genome import TraitSchema
 
-from random import random, gauss, sample
-from numpy.random import vonmises
+import numpy as np
 from math import inf as INF, pi
 from enum import Enum, auto
+from types import MemberDescriptorType
 
 class Decisions(Enum):
     IDLE            = auto()
@@ -32,18 +33,54 @@ class Results(Enum):
 
 class CustomCritterMeta(type):
 
-    def __init__(cls, clsname, bases, attrdict):
-        super().__init__(clsname, bases, attrdict)
+    def __new__(mcls, clsname, bases, attrdict):
         for SuperSpecies in bases:
-            if issubclass(SuperSpecies, Critter):
-                cls.START_TRAITS = {**SuperSpecies.START_TRAITS, **cls.START_TRAITS}
-                cls.MUTABILITY = {**SuperSpecies.MUTABILITY, **cls.MUTABILITY}
-                cls.LIMITS = {**SuperSpecies.LIMITS, **cls.LIMITS}
+            if isinstance(SuperSpecies, CustomCritterMeta):
+                attrdict['START_TRAITS'] = {**SuperSpecies.START_TRAITS, **attrdict.get('START_TRAITS', {})}
+                attrdict['MUTABILITY'] = {**SuperSpecies.MUTABILITY, **attrdict.get('MUTABILITY', {})}
+                attrdict['LIMITS'] = {**SuperSpecies.LIMITS, **attrdict.get('LIMITS', {})}
+
+        # every trait gets its own slot, so reading one is a plain attribute lookup
+        # species that don't declare __slots__ themselves still get a __dict__ for whatever else they store
+        slots = list(attrdict.get('__slots__', ()))
+        if '__slots__' not in attrdict and bases:
+            slots.append('__dict__')
+        for trait in attrdict.get('START_TRAITS', {}):
+            inherited = [getattr(Base, trait) for Base in bases if hasattr(Base, trait)]
+            if trait in attrdict or any(not isinstance(attr, MemberDescriptorType) for attr in inherited):
+                raise TypeError(f"trait '{trait}' of {clsname} clashes with an attribute of the same name")
+            if not inherited:
+                slots.append(trait)
+        if any('__dict__' in vars(Ancestor) for Base in bases for Ancestor in Base.__mro__):
+            slots = [s for s in slots if s != '__dict__']
+        attrdict['__slots__'] = tuple(slots)
+        cls = super().__new__(mcls, clsname, bases, attrdict)
+        cls.SCHEMA = TraitSchema(cls)    # genome layout of the species
+        return cls
+
+def _nav_desire(headings, base, *sources):
+    # desire for each candidate heading: base, plus sign * value/(angle/angleoffset + rho/distance) for every
+    # source (rows rho, phi, value), added up in the same order the scalar loops did so the result is identical
+    columns = [base[:,None]]
+    for options, angleoffset, distance, sign in sources:
+        if len(options):
+            rho, phi, value = np.array(options, dtype=float).T
+            with np.errstate(divide='ignore', invalid='ignore'):
+                columns.append(sign*value / (util.angles(headings[:,None], phi)/angleoffset + rho/distance))
+    return np.cumsum(np.hstack(columns), axis=1)[:,-1]
 
 class Critter(metaclass=CustomCritterMeta):
 
     DESCRIPTION = "The default species of critter"
 
+    # instance state besides the traits, which CustomCritterMeta adds
+    __slots__ = ('world', 'bio', 'max_age', 'birth', 'generation', 'genome',
+                 'reach', 'max_speed', 'max_energy', 'metabolic_upkeep',
+                 '_energy', 'loc', '_age', 'offspring_genomes', 'gestation_timer',
+                 'last_heading', 'last_decision', 'last_target', 'last_result',
+                 '_visible_critters_cache', '_visible_food_cache', '_bearings_cache',
+                 '_stats')
+
     # default starting values
     START_TRAITS = {
         'per_critter': 60,                  # perception range of other critters
@@ -105,29 +142,30 @@ class Critter(metaclass=CustomCritterMeta):
 
     #NITTY-GRITTY
 
-    def __init__(self, world, energy=None, loc=None, age=0, max_age=None, traits=None, bio=BioAssumptions, generation=0):
+    def __init__(self, world, energy=None, loc=None, age=0, max_age=None, traits=None, bio=BioAssumptions, generation=0,
+                 genome=None, derived=None):
 
         self.world = world
+        self._stats = None      # the world's running totals for this species, once tracked
 
         if loc is None:
-            loc = (random()*world.size, random()*world.size)
+            loc = tuple((world.placement_rng.random(2) * world.size).tolist())
         if max_age is None:
             max_age = self.MAX_AGE
-        if traits is None:
-            traits = self.START_TRAITS
+        if genome is None:
+            genome = self.SCHEMA.encode(traits or {})
 
         # facts
         self.bio = bio
         self.max_age = max_age
-        self.traits = traits
+        self._express(genome)
         self.birth = world.turn
         self.generation = generation
 
-        # derived traits
-        self.reach = self.bio.derive_reach(self)
-        self.max_speed = self.bio.derive_max_speed(self)
-        self.max_energy = self.bio.derive_max_energy(self)
-        self.metabolic_upkeep = self.bio.derive_metabolic_upkeep(self)
+        # derived traits, unless they were already derived alongside the genome
+        if derived is None:
+            derived = self.bio.derive_stats(self)
+        self.reach, self.max_speed, self.max_energy, self.metabolic_upkeep = [float(stat) for stat in derived]
 
         # state info
         if energy is None:
@@ -135,9 +173,9 @@ class Critter(metaclass=CustomCritterMeta):
         self.energy = energy
         self.loc = loc
         self.age = age
-        self.offspring_traits = []     # holds traits of children during gestation
+        self.offspring_genomes = []    # holds (genome, derived stats or None) of children during gestation
         self.gestation_timer = None    # countdown to giving birth
-        self.last_heading = util.rand_phi()
+        self.last_heading = world.placement_rng.uniform(-pi, pi)
         self.last_decision = Decisions.IDLE
         self.last_target = None
         self.last_result = Results.SUCCESS
@@ -145,10 +183,12 @@ class Critter(metaclass=CustomCritterMeta):
         # caches
         self._visible_critters_cache = (-1, [])
         self._visible_food_cache = (-1, [])
+        self._bearings_cache = (-1, [], [])
 
     def wipe_caches(self):
         del self._visible_critters_cache
         del self._visible_food_cache
+        del self._bearings_cache
 
     @property
     def visible_critters(self):
@@ -164,6 +204,8 @@ class Critter(metaclass=CustomCritterMeta):
                 if rho <= self.per_critter:
                     found.append( (rho, critter) )
             self._visible_critters_cache = (self.world.turn, found)
+            if self.world.profiler is not None:
+                self.world.profiler.accepted('critters', len(found))
             return found
 
     @property
@@ -172,33 +214,58 @@ class Critter(metaclass=CustomCritterMeta):
         if turn == self.world.turn:
             return cached
         else:
-            found = []
-            for food in self.world.search_food(self.loc, self.per_food):
-                rho = util.dist2(self.loc, food.loc)
-                if rho <= self.per_food:
-                    found.append( (rho, food) )
+            found = self.world.food_within(self.loc, self.per_food)
             self._visible_food_cache = (self.world.turn, found)
             return found
 
+    @property
+    def bearings(self):
+        # start-of-turn bearing of everything seen this turn, when World.perceive has filled it in
+        turn, found, phis = self._bearings_cache
+        if turn != self.world.turn:
+            return {}
+        if not isinstance(phis, dict):
+            phis = {thing: phi for (_, thing), phi in zip(found, phis)}
+            self._bearings_cache = (turn, found, phis)
+        return phis
+
     @property
     def energy(self):
         return self._energy
 
     @energy.setter
     def energy(self, e):
-        self._energy = min(e, self.max_energy)
+        e = min(e, self.max_energy)
+        if self._stats is not None:
+            self._stats.energy += e - self._energy
+        self._energy = e
 
+    @property
+    def age(self):
+        return self._age
 
-    def __getattr__(self, name):
-        # only called if *self* has no attribute *name*
-        # allows traits to be referred to like properties w/o manually defining each
-        if name == 'traits':
-            raise AttributeError('traits')
-            
-        if name in self.traits:
-            return self.traits[name]
-        else:
-            raise AttributeError(name)
+    @age.setter
+    def age(self, age):
+        if self._stats is not None:
+            self._stats.age += age - self._age
+        self._age = age
+
+
+    @property
+    def traits(self):
+        return self.SCHEMA.decode(self.genome)
+
+    @traits.setter
+    def traits(self, traits):
+        self._express(self.SCHEMA.encode(traits))
+
+    def _express(self, genome):
+        # the genome is the heritable record; each trait is also copied into its slot for fast reads
+        if self._stats is not None:
+            self._stats.traits += genome - self.genome
+        self.genome = genome
+        for trait, val in zip(self.SCHEMA.names, genome.tolist()):
+            setattr(self, trait, val)
 
 
     def take_turn(self):
@@ -253,31 +320,22 @@ class Critter(metaclass=CustomCritterMeta):
                             for r,f in self.visible_food]
             predators =    [(r, self._rel_phi(p), self._threat_eval(p))
                             for r,p in self.visible_critters if self._is_predator(p)]
-            competitors =  [(util.dist2(self.loc, c.loc), self._rel_phi(c), self._food_competition_eval(c))
-                            for _,c in self.visible_critters if self._food_competitor(c)]
-            desire = {}
-            for dist, heading, _ in food_options:
-                desire[(dist, heading)] = 0
-
-                # summing value of food in this direction
-                for rho, phi, value in food_options:
-                    ang = util.angle(heading, phi)
-                    desire[(dist, heading)] += value/( (ang/self.nav_angleoffset_food) + (rho/self.nav_distance_food) )
-
-                # subtracting value of competitors in this direction
-                for comp_dist, phi, competition in competitors:
-                    ang = util.angle(heading, phi)
-                    desire[(dist, heading)] -= competition/( (ang/self.nav_angleoffset_competitor) + (comp_dist/self.nav_distance_competitor) )
-
-                # subtracting value of predators in this direction
-                for rho, phi, threat in predators:
-                    ang = util.angle(heading, phi)
-                    desire[(dist, heading)] -= threat/( (ang/self.nav_angleoffset_predator) + (rho/self.nav_distance_pred) )
-
-            if any(value > 0 for value in desire.values()):
-                dist, heading = max(desire, key=lambda k: desire[k])
-                dist = dist - self.reach
-                return Decisions.SEEK_FOOD, (dist, heading)
+            competitors =  [(r, self._rel_phi(c), self._food_competition_eval(c))
+                            for r,c in self.visible_critters if self._food_competitor(c)]
+            if not food_options:
+                return None, None
+            dists, headings, _ = np.array(food_options, dtype=float).T
+
+            # summing value of food in each direction, then subtracting value of competitors and predators
+            desire = _nav_desire(headings, np.zeros(len(headings)),
+                        (food_options, self.nav_angleoffset_food, self.nav_distance_food, 1),
+                        (competitors, self.nav_angleoffset_competitor, self.nav_distance_competitor, -1),
+                        (predators, self.nav_angleoffset_predator, self.nav_distance_pred, -1))
+
+            best = np.argmax(desire)
+            if desire[best] > 0:
+                dist = dists[best].item() - self.reach
+                return Decisions.SEEK_FOOD, (dist, headings[best].item())
             else:
                 return None, None
 
@@ -289,20 +347,20 @@ class Critter(metaclass=CustomCritterMeta):
         else:
             predators =    [(r, self._rel_phi(p), self._threat_eval(p))
                             for r,p in self.visible_critters if self._is_predator(p)]
-            desire = {}
-            for dist, mate_option in [(r,m) for r,m in self.visible_critters if self._valid_mate(m)]:
-                heading = self._rel_phi(mate_option)
-                desire[(dist, heading)] = self._mate_eval(mate_option)/(dist/self.nav_distance_mate)
-
-                # subtracting value of predators in this direction
-                for rho, phi, threat in predators:
-                    ang = util.angle(heading, phi)
-                    desire[(dist, heading)] -= threat/( (ang/self.nav_angleoffset_predator) + (rho/self.nav_distance_pred) )
-
-            if any(value > 0 for value in desire.values()):
-                dist, heading = max(desire, key=lambda k: desire[k])
-                dist = dist - self.reach
-                return Decisions.SEEK_MATE, (dist, heading)
+            mate_options = [(r, self._rel_phi(m), self._mate_eval(m))
+                            for r,m in self.visible_critters if self._valid_mate(m)]
+            if not mate_options:
+                return None, None
+            dists, headings, values = np.array(mate_options, dtype=float).T
+
+            # subtracting value of predators in each direction
+            desire = _nav_desire(headings, values/(dists/self.nav_distance_mate),
+                        (predators, self.nav_angleoffset_predator, self.nav_distance_pred, -1))
+
+            best = np.argmax(desire)
+            if desire[best] > 0:
+                dist = dists[best].item() - self.reach
+                return Decisions.SEEK_MATE, (dist, headings[best].item())
             else:
                 return None, None
 
@@ -331,7 +389,7 @@ class Critter(metaclass=CustomCritterMeta):
         return Decisions.FLEE, (self.max_speed, heading)
 
     def wander(self):
-        phi = vonmises(self.last_heading, self.wander_faith)
+        phi = self.world.wander_heading(self)
         rho = self.wander_effort * self.max_speed
         return Decisions.WANDER, (rho, phi)
 
@@ -351,7 +409,7 @@ class Critter(metaclass=CustomCritterMeta):
         elif decision in [Decisions.DEPART, Decisions.STARVE]:
             self._die()
         elif decision is Decisions.BREED_SEX:
-            if self.world.decisions[target] is (Decisions.BREED_SEX, self): # if potential mate also decided to mate and chose this critter
+            if self.world.decisions[target] == (Decisions.BREED_SEX, self): # if potential mate also decided to mate and chose this critter
                 self.reproduce_sex(target)
             else:
                 return Results.FAILURE
@@ -374,22 +432,23 @@ class Critter(metaclass=CustomCritterMeta):
 
     def reproduce_asex(self):
         self.energy -= self.bio.repro_cost(self)
-        self.offspring_traits.append(self._clone())
+        self.world.conceive(self)
         self.gestation_timer = self.bio.gestation_period(self)
 
     def reproduce_sex(self, mate):
         self.energy -= self.bio.repro_cost(self)
-        self.offspring_traits.append(self._combine_chromosomes(mate))
+        self.world.conceive(self, mate)
         self.gestation_timer = self.bio.gestation_period(self)
 
     def give_birth(self):
         Subspecies = type(self)     # so that children are of the same subclass
-        for new_traits in self.offspring_traits:
+        for new_genome, derived in self.offspring_genomes:
             energy_donation = min(self.energy, self.energy_inheritance * self.max_energy)
             self.energy -= energy_donation
-            child = Subspecies(self.world, loc=self.loc, traits=new_traits, energy=energy_donation, generation=self.generation+1)
+            child = Subspecies(self.world, loc=self.loc, genome=new_genome, derived=derived, bio=self.bio,
+                               energy=energy_donation, generation=self.generation+1)
             self.world.add_critter(child)
-        self.offspring_traits = []
+        self.offspring_genomes = []
         self.gestation_timer = None
 
     # HELPERS
@@ -405,34 +464,13 @@ class Critter(metaclass=CustomCritterMeta):
         self.last_heading = phi
         
 
+    # World.conceive draws the offspring of every default-breeding critter in one batch at the end of the turn;
+    # these are only called for species that override them
     def _clone(self):
-        new_traits = {}
-        for trait, val in self.traits.items():
-            cv = self.MUTABILITY.get(trait, self.DEFAULT_CV)
-            mu = self.traits[trait]
-            new_val = gauss(mu, mu*cv)
-            if trait in self.LIMITS:
-                lower,upper = self.LIMITS[trait]
-                new_val = max(min(upper, new_val), lower)
-            new_traits[trait] = new_val
-        return new_traits
+        return self.SCHEMA.mutate(self.genome[None], self.world.mutation_rng)[0]
 
     def _combine_chromosomes(self, mate):
-        new_traits = {}
-        num_traits = len(self.traits)
-        self_chromosome = sample(range(num_traits), num_traits//2)
-        for idx, trait in enumerate(self.traits):
-            cv = self.MUTABILITY.get(trait, self.DEFAULT_CV)
-            if idx in self_chromosome:
-                mu = self.traits[trait]
-            else:
-                mu = mate.traits[trait]
-            new_val = gauss(mu, mu*cv)
-            if trait in self.LIMITS:
-                lower,upper = self.LIMITS[trait]
-                new_val = min(upper, max(lower, new_val))
-            new_traits[trait] = new_val
-        return new_traits
+        return self.SCHEMA.crossover(self.genome[None], mate.genome[None], self.world.mutation_rng)[0]
 
     def _die(self):
         self.world.untrack_critter(self)
@@ -465,4 +503,7 @@ class Critter(metaclass=CustomCritterMeta):
         return type(self) is type(other)
 
     def _rel_phi(self, other):
-        return util.rel_phi(self.loc, other.loc)
\ No newline at end of file
+        phi = self.bearings.get(other)
+        if phi is None:
+            phi = util.rel_phi(self.loc, other.loc)
+        return phi
\ No newline at end of file
@@ -1,5 +1,9 @@
 import matplotlib.pyplot as plt
 from collections import defaultdict as dd
+import numpy as np
+import json
+import os
+from tempfile import mkstemp
 
 COLORS = ['r', 'g', 'b', 'c', 'm', 'y']
 
@@ -53,69 +57,175 @@ class Data():
         self.multi_plot(**plots)
 
     def multi_plot(self, xlabel="Turn", **kwargs):
-        # https://matplotlib.org/3.2.0/gallery/ticks_and_spines/multiple_yaxis_with_spines.html
+        multi_plot(list(range(self.turns)), xlabel, **kwargs)
 
-        fig, host = plt.subplots()
-        #fig.subplots_adjust(right=.8)
-        fig.set_tight_layout(True)
+    def accumulate(self, count_list):
+        ret_list = [count_list[0]]
+        for t in range(1, self.turns):
+            ret_list.append(ret_list[t-1] + count_list[t])
+        return ret_list
 
-        (main_label, main_data), *parasites = kwargs.items()
+    def list_data(self, ddict):
+        retlist = [0] * self.turns
+        for t, d in ddict.items():
+            retlist[t] = d
+        return retlist
 
-        xpoints = list(range(self.turns))
 
-        line, = host.plot(xpoints, main_data, 'k-', label=main_label)
-        host.yaxis.label.set_color(line.get_color())
+class MetricsRecorder:
+    '''
+        Per-turn metrics for runs too long to keep in memory. Each turn is a row of fixed numeric fields,
+        gathered in a preallocated buffer and appended to a raw binary file whenever the buffer fills;
+        the field layout sits next to it in <path>.json. columns() maps the file back in without copying.
+        Fields missing from a turn's record are NaN. Without a path, the rows go to a temporary file that close()
+        removes, keeping them in memory instead.
+    '''
+    FIELDS = ('pop', 'avg_age', 'born', 'avg_generation', 'max_generation', 'starved', 'old_age', 'prey',
+              'avg_energy', 'food_energy', 'food_expired')
+
+    def __init__(self, path=None, fields=FIELDS, buffer_rows=4096, append=False):
+        # append: carry on an existing file (e.g. after resuming from a checkpoint) rather than starting over
+        self.temporary = path is None
+        if self.temporary:
+            handle, path = mkstemp(suffix='.metrics')
+            os.close(handle)
+        self.path = path
+        self.kept = None    # a temporary file's rows, once it's gone
+        self.fields = tuple(fields)
+        self.dtype = np.dtype([('turn', np.int64)] + [(f, np.float64) for f in self.fields])
+        self.buffer = np.zeros(buffer_rows, self.dtype)
+        self.filled = 0
+        self.written = 0
+        if append and os.path.exists(path):
+            if read_metrics(path).dtype != self.dtype:
+                raise ValueError(f"{path} holds different fields")
+            self.written = os.path.getsize(path) // self.dtype.itemsize
+        else:
+            with open(f"{path}.json", 'w') as f:
+                json.dump(self.dtype.descr, f)
+        self.file = open(path, 'ab' if append else 'wb')
+
+    def __len__(self):
+        return self.written + self.filled
+
+    def record(self, turn, **values):
+        if self.file.closed:
+            raise ValueError("record on a closed MetricsRecorder")
+        self.buffer[self.filled] = (turn, *[values.get(f, np.nan) for f in self.fields])
+        self.filled += 1
+        if self.filled == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.file.closed:
+            raise ValueError("flush of a closed MetricsRecorder")
+        self.file.write(self.buffer[:self.filled].tobytes())
+        self.file.flush()
+        self.written += self.filled
+        self.filled = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        if self.temporary:
+            self.kept = np.array(read_metrics(self.path))
+            os.remove(self.path)
+            os.remove(f"{self.path}.json")
+
+    def columns(self):
+        # every row so far, as a read-only structured array over the file, e.g. columns()['pop']
+        if self.kept is not None:
+            return self.kept
+        if not self.file.closed:
+            self.flush()
+        return read_metrics(self.path)
 
-        host.set_xlim(0, xpoints[-1])
-        host.set_ylim(0, 1.15*max(main_data))
+    def plot_thermo(self):
+        rows = self.columns()
+        multi_plot(rows['turn'], **{
+            "Population": rows['pop'],
+            "Average Energy Level": rows['avg_energy'],
+            "Total Available Food": rows['food_energy'],
+        })
 
-        host.set_xlabel(xlabel)
-        host.set_ylabel(main_label)
+    def plot_demo(self):
+        rows = self.columns()
+        multi_plot(rows['turn'], **{
+            "Population": rows['pop'],
+            "Average Age": rows['avg_age'],
+            "Dead of Old Age (cum.)": np.nancumsum(rows['old_age']),
+            "Dead of Starvation (cum.)": np.nancumsum(rows['starved']),
+            "Critters Born": rows['born'],
+            "Max Generation": rows['max_generation'],
+        })
 
-        tkw = dict(size=4, width=1.5)
-        host.tick_params(axis='x', **tkw)
-        host.tick_params(axis='y', colors=line.get_color(), **tkw)
+    def compile_plots(self):
+        self.plot_thermo()
+        self.plot_demo()
 
-        lines = [line]
 
-        for count, (label, data) in enumerate(parasites):
+def read_metrics(path):
+    # a MetricsRecorder's file, memory-mapped
+    with open(f"{path}.json") as f:
+        dtype = np.dtype([tuple(field) for field in json.load(f)])
+    rows = os.path.getsize(path) // dtype.itemsize
+    if not rows:
+        return np.zeros(0, dtype)
+    return np.memmap(path, dtype, mode='r', shape=(rows,))
 
-            parasite = host.twinx()
 
-            # Offset the right spine of parasite.  The ticks and label have already been
-            # placed on the right by twinx above.
-            parasite.spines["right"].set_position(("axes", 1+(0.05*count)))
-            # Having been created by twinx, parasite has its frame off, so the line of its
-            # detached spine is invisible.  First, activate the frame but make the patch
-            # and spines invisible.
-            parasite.set_frame_on(True)
-            parasite.patch.set_visible(False)
-            for sp in parasite.spines.values():
-                sp.set_visible(False)
-            # Second, show the right spine.
-            parasite.spines["right"].set_visible(True)
+def multi_plot(xpoints, xlabel="Turn", **kwargs):
+    # https://matplotlib.org/3.2.0/gallery/ticks_and_spines/multiple_yaxis_with_spines.html
 
-            line, = parasite.plot(xpoints, data, COLORS[count]+'-', label=label)
+    fig, host = plt.subplots()
+    #fig.subplots_adjust(right=.8)
+    fig.set_tight_layout(True)
 
-            parasite.set_ylim(0, max(1, 1.15*max(data)))
-            parasite.set_ylabel(label)
+    (main_label, main_data), *parasites = kwargs.items()
 
-            parasite.yaxis.label.set_color(line.get_color())
+    line, = host.plot(xpoints, main_data, 'k-', label=main_label)
+    host.yaxis.label.set_color(line.get_color())
 
-            parasite.tick_params(axis='y', colors=line.get_color(), **tkw)
+    host.set_xlim(0, xpoints[-1])
+    host.set_ylim(0, 1.15*np.nanmax(main_data))
 
-            lines.append(line)
+    host.set_xlabel(xlabel)
+    host.set_ylabel(main_label)
 
-        #host.legend(lines, [l.get_label() for l in lines])
+    tkw = dict(size=4, width=1.5)
+    host.tick_params(axis='x', **tkw)
+    host.tick_params(axis='y', colors=line.get_color(), **tkw)
 
-    def accumulate(self, count_list):
-        ret_list = [count_list[0]]
-        for t in range(1, self.turns):
-            ret_list.append(ret_list[t-1] + count_list[t])
-        return ret_list
+    lines = [line]
 
-    def list_data(self, ddict):
-        retlist = [0] * self.turns
-        for t, d in ddict.items():
-            retlist[t] = d
-        return retlist
+    for count, (label, data) in enumerate(parasites):
+
+        parasite = host.twinx()
+
+        # Offset the right spine of parasite.  The ticks and label have already been
+        # placed on the right by twinx above.
+        parasite.spines["right"].set_position(("axes", 1+(0.05*count)))
+        # Having been created by twinx, parasite has its frame off, so the line of its
+        # detached spine is invisible.  First, activate the frame but make the patch
+        # and spines invisible.
+        parasite.set_frame_on(True)
+        parasite.patch.set_visible(False)
+        for sp in parasite.spines.values():
+            sp.set_visible(False)
+        # Second, show the right spine.
+        parasite.spines["right"].set_visible(True)
+
+        line, = parasite.plot(xpoints, data, COLORS[count]+'-', label=label)
+
+        parasite.set_ylim(0, max(1, 1.15*np.nanmax(data)))
+        parasite.set_ylabel(label)
+
+        parasite.yaxis.label.set_color(line.get_color())
+
+        parasite.tick_params(axis='y', colors=line.get_color(), **tkw)
+
+        lines.append(line)
+
+    #host.legend(lines, [l.get_label() for l in lines])
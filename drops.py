@@ -0,0 +1,86 @@
+import numpy as np
+from math import pi
+from collections import namedtuple
+
+# one kind of food drop registered with a world: mu drops of *food* per unit area per unit time on average (with
+# coefficient of variation cv), scaled by the world's abundance and by season(turn) if given, and spread over the
+# world in proportion to a Fertility map if given, uniformly if not
+FoodDrop = namedtuple('FoodDrop', ('food', 'mu', 'cv', 'fertility', 'season'), defaults=(5, 0.2, None, None))
+
+
+class AliasTable:
+    '''
+        Vose's alias method: after O(n) set-up, each sample from the discrete distribution with the given weights
+        costs one uniform index and one coin flip, however many weights there are.
+    '''
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=float).ravel()
+        if len(weights) == 0 or weights.min() < 0 or not weights.sum() > 0:
+            raise ValueError("weights must be non-negative with a positive sum")
+        n = len(weights)
+        scaled = (weights * n / weights.sum()).tolist()
+        self.prob = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] += scaled[s] - 1
+            (small if scaled[l] < 1 else large).append(l)
+        # whatever's left over is 1 up to rounding
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, rng, count):
+        picks = rng.integers(len(self.prob), size=count)
+        return np.where(rng.random(count) < self.prob[picks], picks, self.alias[picks])
+
+
+class Fertility:
+    '''
+        How fertile each cell of a raster over the world is, relative to the others; grid[x, y].
+        Food drops land in a cell in proportion to its fertility, anywhere within it.
+    '''
+    def __init__(self, grid, size):
+        self.grid = np.asarray(grid, dtype=float)
+        self.size = size
+        self.cell = size / np.array(self.grid.shape)
+        self.table = AliasTable(self.grid)
+
+    def sample(self, rng, count):
+        cells = self.table.sample(rng, count)
+        x, y = np.divmod(cells, self.grid.shape[1])
+        return (np.column_stack([x, y]) + rng.random((count, 2))) * self.cell
+
+
+class Seasons:
+    '''
+        An abundance curve rising and falling around 1 by *amplitude* every *period* turns.
+    '''
+    def __init__(self, period, amplitude=.5, phase=0.):
+        self.period = period
+        self.amplitude = amplitude
+        self.phase = phase
+
+    def __call__(self, turn):
+        return max(0., 1 + self.amplitude * np.sin(2*pi*turn/self.period + self.phase))
+
+
+class Curve:
+    '''
+        An abundance curve through the given (turn, multiplier) points, linear between them and flat beyond them;
+        with *period*, it repeats every period turns.
+    '''
+    def __init__(self, turns, multipliers, period=None):
+        self.turns = list(turns)
+        self.multipliers = list(multipliers)
+        self.period = period
+
+    def __call__(self, turn):
+        if self.period is not None:
+            turn %= self.period
+        return max(0., float(np.interp(turn, self.turns, self.multipliers)))
@@ -1,31 +1,77 @@
-from random import random
+from math import ceil, log, inf as INF
 
 class Food:
+    '''
+        Every turn food loses SPOIL of its original amount plus DECAY of what's left,
+            a[k+1] = (1-DECAY)*a[k] - SPOIL*A
+        which has the closed form
+            a[k] = (a[0] + F)*(1-DECAY)**k - F,     F = SPOIL*A/DECAY
+        so the amount left is only worked out when it's asked for, from the amount at the last bite (or drop)
+        and the turns since then. The world queues the turn each food runs out, so untouched food costs
+        nothing from turn to turn.
+    '''
 
     DESCRIPTION = "The default food"
 
     DEFAULT_AMOUNT = 60
+    DECAY = 0.01        # fraction of what's left lost each turn
+    SPOIL = 0.0005      # fraction of the original amount lost each turn
+
+    __slots__ = ('world', 'loc', 'original_amount', '_amount', '_since', 'expiry')
 
     def __init__(self, world, amount=DEFAULT_AMOUNT, loc=None):
         self.world = world
         if loc is None:
-            loc = (random()*world.size, random()*world.size)
+            loc = tuple((world.food_rng.random(2) * world.size).tolist())
         self.loc = loc
-        self.amount_left = amount
         self.original_amount = amount
+        self.amount_left = amount
+
+    @property
+    def amount_left(self):
+        return self.decayed(self._amount, self.world.turn - self._since)
+
+    @amount_left.setter
+    def amount_left(self, amount):
+        self.anchor(amount, self.world.turn)
+
+    def anchor(self, amount, turn):
+        # *amount* was left as of *turn*, and it decays from there
+        self._amount = amount
+        self._since = turn
+        self.expiry = self._since + self.turns_left(amount)     # the turn it has decayed away by
+        if self.expiry < INF:   # food with nothing left goes at the next expire_food
+            self.world.schedule_expiry(self)
 
-    def take_turn(self):
-        self.deteriorate()
+    def decayed(self, amount, turns):
+        # what's left of *amount* after *turns* turns
+        floor = self.SPOIL * self.original_amount / self.DECAY
+        return (amount + floor) * (1 - self.DECAY)**turns - floor
 
-    def deteriorate(self):
-        self.deplete(0.0005*self.original_amount + 0.01*self.amount_left)
+    def turns_left(self, amount):
+        # turns until *amount* has decayed away
+        if amount <= 0:
+            return 0
+        floor = self.SPOIL * self.original_amount / self.DECAY
+        if floor <= 0:
+            return INF
+        turns = max(0, ceil(log(floor / (amount + floor)) / log(1 - self.DECAY)))
+        # settle any rounding in the logarithms against decayed itself
+        while turns > 0 and self.decayed(amount, turns-1) <= 0:
+            turns -= 1
+        while self.decayed(amount, turns) > 0:
+            turns += 1
+        return turns
 
     def bite(self, size):
         size = min(size, self.amount_left)
+        if size <= 0:   # already eaten up earlier this turn
+            return 0
         self.deplete(size)
         return size
 
     def deplete(self, size):
         self.amount_left -= size
-        if self.amount_left <= 0:
-            self.world.untrack_food(self)
\ No newline at end of file
+        if self._amount <= 0:
+            self.expiry = None
+            self.world.untrack_food(self)
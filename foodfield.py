@@ -0,0 +1,85 @@
+from food import Food
+
+import numpy as np
+
+# Food behaviour a FoodField reproduces in bulk
+FOOD_RULES = ('DECAY', 'SPOIL', 'decayed', 'turns_left', 'bite', 'deplete')
+
+
+def check_rules(food, engine):
+    # FoodFields only know the default Food rules, so food types changing them can't be kept in one
+    overridden = [rule for rule in FOOD_RULES if getattr(food, rule) is not getattr(Food, rule)]
+    if overridden:
+        raise TypeError(f"{food.__name__} overrides {', '.join(overridden)}; {engine} only runs the default Food rules")
+
+
+class FoodField:
+    '''
+        Food kept as columns (location, amount left, original amount and an optional group, e.g. the replica
+        it's in) rather than Food objects, for engines that work on arrays anyway.
+        Drops are added in one go and decay and bites are applied to whole columns. Food that runs out stays
+        in the columns, with nothing left, until it makes up COMPACT_AT of them, so compact() only copies the
+        columns now and then; live() gives the entries with food left, in order, whenever they're needed.
+    '''
+    COMPACT_AT = .25
+
+    def __init__(self):
+        self.loc = np.zeros((0, 2))
+        self.amount = np.zeros(0)
+        self.original = np.zeros(0)
+        self.group = np.zeros(0, np.int64)
+        self._live = None   # cached indices of the entries with food left
+
+    def __len__(self):
+        return len(self.live())
+
+    def live(self):
+        if self._live is None:
+            self._live = np.flatnonzero(self.amount > 0)
+        return self._live
+
+    def columns(self):
+        # (indices, loc, amount, group) of the entries with food left
+        live = self.live()
+        if len(live) == len(self.amount):
+            return live, self.loc, self.amount, self.group
+        return live, self.loc[live], self.amount[live], self.group[live]
+
+    def energy(self, groups=None):
+        # total food left, or the total in each of *groups* groups
+        if groups is None:
+            return float(self.amount.sum())
+        return np.bincount(self.group, weights=self.amount, minlength=groups)
+
+    def spawn(self, loc, amount, group=0):
+        n = len(loc)
+        self.loc = np.concatenate([self.loc, loc])
+        self.amount = np.concatenate([self.amount, np.broadcast_to(np.asarray(amount, dtype=float), n)])
+        self.original = np.concatenate([self.original, np.broadcast_to(np.asarray(amount, dtype=float), n)])
+        self.group = np.concatenate([self.group, np.broadcast_to(np.asarray(group, dtype=np.int64), n)])
+        self._live = None
+
+    def set_amounts(self, amount):
+        self.amount = np.array(amount, dtype=float)
+        self._live = None
+
+    def decay(self):
+        # a turn of Food decay, all at once
+        self.amount -= Food.SPOIL*self.original + Food.DECAY*self.amount
+        np.maximum(self.amount, 0, out=self.amount)
+        self._live = None
+
+    def bite(self, entries, bites):
+        self.amount -= np.bincount(entries, weights=bites, minlength=len(self.amount))
+        np.maximum(self.amount, 0, out=self.amount)
+        self._live = None
+
+    def compact(self, force=False):
+        live = self.live()
+        spent = len(self.amount) - len(live)
+        if spent and (force or spent >= self.COMPACT_AT * len(self.amount)):
+            self.loc = self.loc[live]
+            self.amount = self.amount[live]
+            self.original = self.original[live]
+            self.group = self.group[live]
+            self._live = None
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+class TraitSchema:
+    '''
+        Fixed layout of a species' genome: one float per trait, in START_TRAITS order.
+        Mutability and limits are kept as arrays so mutation, crossover and clamping work on
+        whole batches of genomes (one row each) at once.
+    '''
+    def __init__(self, Species):
+        self.names = tuple(Species.START_TRAITS)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.defaults = np.array([Species.START_TRAITS[t] for t in self.names], dtype=float)
+        self.cv = np.array([Species.MUTABILITY.get(t, Species.DEFAULT_CV) for t in self.names], dtype=float)
+        limits = [Species.LIMITS.get(t, (-np.inf, np.inf)) for t in self.names]
+        self.lower, self.upper = np.array(limits, dtype=float).reshape(-1, 2).T
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, traits):
+        # traits not given keep their START_TRAITS value
+        genome = self.defaults.copy()
+        for trait, val in traits.items():
+            genome[self.index[trait]] = val
+        return genome
+
+    def decode(self, genome):
+        return dict(zip(self.names, genome.tolist()))
+
+    def mutate(self, genomes, rng=np.random):
+        # each trait drawn from a normal around the parent's value with SD = value * cv, then clamped
+        genomes = np.asarray(genomes, dtype=float)
+        noise = rng.standard_normal(genomes.shape)
+        return np.clip(genomes + genomes*self.cv*noise, self.lower, self.upper)
+
+    def crossover(self, genomes, mate_genomes, rng=np.random):
+        # each child takes a random half of its traits from the first parent and the rest from the mate
+        genomes = np.asarray(genomes, dtype=float)
+        ranks = np.argsort(rng.random(genomes.shape), axis=1)
+        from_self = ranks < len(self)//2
+        return self.mutate(np.where(from_self, genomes, mate_genomes), rng)
+
+    def offspring(self, genomes, mate_genomes, rng=np.random):
+        # children of a batch of parents; rows of mate_genomes that are all NaN mean asexual reproduction
+        genomes = np.asarray(genomes, dtype=float).reshape(-1, len(self))
+        mate_genomes = np.asarray(mate_genomes, dtype=float).reshape(-1, len(self))
+        asexual = np.isnan(mate_genomes).all(axis=1)
+        mate_genomes = np.where(asexual[:,None], genomes, mate_genomes)
+        return self.crossover(genomes, mate_genomes, rng)
@@ -6,7 +6,6 @@ from custom_widgets import *
 
 import tkinter as tk
 import tkinter.ttk as ttk
-from random import randint
 from math import sqrt
 from time import sleep
 from types import MethodType
@@ -142,8 +141,8 @@ class MainWindow(tk.Tk):
         world = self.world_state = self.gui_world.start_new()
         world.set_up_food()
         for species_base, species_guirep in self.gui_species.items():
-            critters = [species_base(world, age=randint(0,species_base.MAX_AGE)) for _ in range(species_guirep.init_pop.get())]
-            world.add_critters(critters)
+            count = species_guirep.init_pop.get()
+            world.populate(species_base, count, ages=world.placement_rng.integers(0, species_base.MAX_AGE, count, endpoint=True))
         self.draw_world()
 
     def play_pause(self):
@@ -0,0 +1,200 @@
+import numpy as np
+
+# cells checked around a center's own cell; cells are at least as wide as the largest radius
+NEIGHBORHOOD = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+BLOCK = 1 << 22     # max candidate pairs held in memory at once
+
+
+def radius_pairs(points, centers, radii, exclude=None, ordered=True, groups=None, work=None):
+    # every (center, point) pair with the point within that center's radius
+    # returns index arrays (ci, pj) and distances, grouped by ci (and sorted by pj within, if ordered)
+    # exclude: optional point index per center that should never pair with it (e.g. itself)
+    # groups: optional (point groups, center groups) integer arrays; points only pair with centers of the same group
+    # work: optional dict whose 'cells' and 'scanned' (see _candidates) are added to
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+    if not len(points) or not len(centers):
+        return empty_pairs()
+
+    found = []
+    for ci, pj in _candidates(points, centers, radii.max(), groups, work):
+        rho = np.hypot(points[pj,0] - centers[ci,0], points[pj,1] - centers[ci,1])
+        keep = rho <= radii[ci]
+        if exclude is not None:
+            keep &= pj != exclude[ci]
+        found.append((ci[keep], pj[keep], rho[keep]))
+    return _collect(found, ordered)
+
+
+def symmetric_pairs(points, radii, ordered=True, work=None):
+    # every pair (i, j), i < j, within the larger of the two points' radii, each measured once
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(points),))
+    if not len(points):
+        return empty_pairs()
+
+    found = []
+    for i, j in _candidates(points, points, radii.max(), work=work):
+        upper = j > i
+        i, j = i[upper], j[upper]
+        rho = np.hypot(points[j,0] - points[i,0], points[j,1] - points[i,1])
+        keep = rho <= np.maximum(radii[i], radii[j])
+        found.append((i[keep], j[keep], rho[keep]))
+    return _collect(found, ordered)
+
+
+def _candidates(points, centers, max_radius, groups=None, work=None):
+    # blocks of (ci, pj) index pairs from the cells around each center, center-major;
+    # a superset of the pairs within max_radius (and in the same group, if given)
+    # work: optional dict to add the number of cells visited ('cells') and of candidates ('scanned') to
+    cell = max(float(max_radius), 1e-9)
+    pcell = np.floor(points / cell).astype(np.int64)
+    ccell = np.floor(centers / cell).astype(np.int64)
+    lo = pcell.min(axis=0)
+    width, height = pcell.max(axis=0) - lo + 1
+    if groups is None:
+        pgroup = cgroup = 0
+        num_groups = 1
+    else:
+        # each group gets its own stack of cells
+        pgroup, cgroup = (np.asarray(g, dtype=np.int64) for g in groups)
+        first = min(pgroup.min(), cgroup.min(initial=pgroup.min()))
+        num_groups = max(pgroup.max(), cgroup.max(initial=pgroup.max())) - first + 1
+        pgroup, cgroup = (pgroup - first) * width, (cgroup - first) * width
+    pkey = (pgroup + pcell[:,0]-lo[0]) * height + (pcell[:,1]-lo[1])
+    order = np.argsort(pkey, kind='stable')
+    cell_starts, cell_counts = _cell_table(pkey[order], num_groups*width*height)
+
+    # one run of sorted points per (center, neighboring cell)
+    starts = np.zeros((len(centers), len(NEIGHBORHOOD)), dtype=np.int64)
+    counts = np.zeros_like(starts)
+    cx = ccell[:,0] - lo[0]
+    cy = ccell[:,1] - lo[1]
+    cgroup = np.broadcast_to(cgroup, cx.shape)
+    for k, (dx, dy) in enumerate(NEIGHBORHOOD):
+        nx = cx + dx
+        ny = cy + dy
+        inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        key = (cgroup[inside] + nx[inside])*height + ny[inside]
+        starts[inside, k], counts[inside, k] = cell_starts(key), cell_counts(key)
+        if work is not None:
+            work['cells'] = work.get('cells', 0) + int(inside.sum())
+    if work is not None:
+        work['scanned'] = work.get('scanned', 0) + int(counts.sum())
+
+    for block in blocks(counts.sum(axis=1), BLOCK):
+        run_counts = counts[block].ravel()
+        ci = np.repeat(np.arange(block.start, block.stop).repeat(len(NEIGHBORHOOD)), run_counts)
+        pj = order[concat_ranges(starts[block].ravel(), run_counts)]
+        yield ci, pj
+
+
+def _collect(found, ordered):
+    if not found:
+        return empty_pairs()
+    ci, pj, rho = (np.concatenate(parts) for parts in zip(*found))
+    if not ordered:
+        return ci, pj, rho
+    order = np.lexsort((pj, ci))
+    return ci[order], pj[order], rho[order]
+
+
+def _cell_table(sorted_keys, num_cells):
+    # lookups of where each cell's run starts in sorted_keys, and its length
+    if num_cells <= 4 * len(sorted_keys) + (1 << 16):
+        counts = np.bincount(sorted_keys, minlength=num_cells)
+        starts = np.cumsum(counts) - counts
+        return starts.__getitem__, counts.__getitem__
+    def cell_starts(keys):
+        return np.searchsorted(sorted_keys, keys, 'left')
+    def cell_counts(keys):
+        return np.searchsorted(sorted_keys, keys, 'right') - np.searchsorted(sorted_keys, keys, 'left')
+    return cell_starts, cell_counts
+
+
+def empty_pairs():
+    return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0)
+
+
+class PairTable:
+    '''
+        Every pair of points within the larger of their two radii, with the distance and both
+        bearings worked out once per pair. Each point reads its own side of the table through view().
+    '''
+    def __init__(self, points, radii, work=None):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(points),))
+        i, j, rho = symmetric_pairs(points, radii, ordered=False, work=work)
+        phi = np.arctan2(points[j,1] - points[i,1], points[j,0] - points[i,0])
+        # bearing of i as seen from j, worked out as util.rel_phi would (not phi ± pi, which gives pi rather
+        # than 0 for points in the same place)
+        back = np.arctan2(points[i,1] - points[j,1], points[i,0] - points[j,0])
+
+        owner = np.concatenate([i, j])
+        other = np.concatenate([j, i])
+        rho = np.concatenate([rho, rho])
+        phi = np.concatenate([phi, back])
+        visible = rho <= radii[owner]   # a pair is only in range of the point with the larger radius
+        order = np.lexsort((other[visible], owner[visible]))
+        self.owner = owner[visible][order]
+        self.other = other[visible][order]
+        self.rho = rho[visible][order]
+        self.phi = phi[visible][order]
+        self.bounds = np.searchsorted(self.owner, np.arange(len(points)+1))
+
+    def __len__(self):
+        return len(self.owner)
+
+    def view(self, k):
+        # (other, rho, phi) arrays of every point in range of point k, sorted by index
+        lo, hi = self.bounds[k], self.bounds[k+1]
+        return self.other[lo:hi], self.rho[lo:hi], self.phi[lo:hi]
+
+
+# SEGMENTED ARRAY HELPERS
+# a "segment" is a run of consecutive entries sharing an owner, e.g. all pairs of one center
+
+def concat_ranges(starts, counts):
+    # np.concatenate([np.arange(s, s+c) for s,c in zip(starts, counts)]) without the loop
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, counts) + np.arange(counts.sum())
+
+
+def blocks(weights, limit):
+    # consecutive slices holding roughly *limit* total weight each
+    weights = np.asarray(weights, dtype=np.int64)
+    if not len(weights):
+        return []
+    group = (np.cumsum(weights) - weights) // max(limit, 1)
+    bounds = np.flatnonzero(np.diff(group)) + 1
+    edges = [0, *bounds.tolist(), len(weights)]
+    return [slice(a, b) for a, b in zip(edges, edges[1:])]
+
+
+def cross_segments(seg_a, seg_b, n):
+    # every (a, b) with seg_a[a] == seg_b[b]; seg_b must be sorted
+    count_b = np.bincount(seg_b, minlength=n)
+    start_b = np.cumsum(count_b) - count_b
+    reps = count_b[seg_a]
+    a = np.repeat(np.arange(len(seg_a)), reps)
+    b = concat_ranges(start_b[seg_a], reps)
+    return a, b
+
+
+def segment_first_max(seg, values):
+    # index of the first largest value in each segment present, like max() over each segment's items
+    # seg must be sorted
+    if not len(seg):
+        return np.zeros(0, np.int64)
+    starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+    counts = np.diff(np.r_[starts, len(seg)])
+    is_max = values == np.repeat(np.fmax.reduceat(values, starts), counts)
+    hits = np.flatnonzero(is_max)
+    first = np.r_[True, seg[hits][1:] != seg[hits][:-1]]
+    return hits[first]
+
+
+def segment_any(seg, mask, n):
+    return np.bincount(seg[mask], minlength=n) > 0
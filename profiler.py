@@ -0,0 +1,76 @@
+from critter import Decisions
+
+import numpy as np
+from time import perf_counter
+
+
+class StepProfiler:
+    '''
+        Opt-in instrumentation of World.step: set world.profiler = StepProfiler() to turn it on.
+        Each turn produces one flat record (last) of
+            time_<phase>            seconds spent in each phase of the step
+            decisions_<DECISION>    how many critters made each decision
+            search_<kind>_*         calls, chunks visited, candidates scanned and accepted by range searches,
+                                    including the batched ones of perception
+            perceive_<kind>_pairs   pairs found by the batched perception pass
+        which is also streamed to *recorder* (e.g. a datavis.MetricsRecorder built with fields=StepProfiler.FIELDS).
+    '''
+    PHASES = ('food', 'drop_food', 'perceive', 'shuffle', 'decide', 'predation', 'resolve', 'conceptions', 'compact')
+    SEARCHES = ('critters', 'food')
+    FIELDS = (
+        *[f'time_{phase}' for phase in PHASES],
+        *[f'decisions_{d.name}' for d in Decisions],
+        *[f'search_{kind}_{stat}' for kind in SEARCHES for stat in ('calls', 'chunks', 'scanned', 'accepted')],
+        *[f'perceive_{kind}_pairs' for kind in SEARCHES],
+    )
+
+    def __init__(self, recorder=None):
+        self.recorder = recorder
+        self.turn = None
+        self.current = dict.fromkeys(self.FIELDS, 0)
+        self.last = None
+        self._mark = 0.
+
+    def start(self, turn):
+        self.turn = turn
+        self.current = dict.fromkeys(self.FIELDS, 0)
+        self._mark = perf_counter()
+
+    def lap(self, phase):
+        # time since the previous lap (or the start of the turn) goes to *phase*
+        now = perf_counter()
+        self.current[f'time_{phase}'] += now - self._mark
+        self._mark = now
+
+    def count_decisions(self, decisions):
+        for decision in decisions:
+            self.current[f'decisions_{decision.name}'] += 1
+
+    def count_decision_values(self, values):
+        # the same from an array of Decisions values
+        counts = np.bincount(values, minlength=max(d.value for d in Decisions) + 1)
+        for d in Decisions:
+            self.current[f'decisions_{d.name}'] += int(counts[d.value])
+
+    def search(self, kind, chunks, scanned, calls=1):
+        self.current[f'search_{kind}_calls'] += calls
+        self.current[f'search_{kind}_chunks'] += chunks
+        self.current[f'search_{kind}_scanned'] += scanned
+
+    def accepted(self, kind, count):
+        self.current[f'search_{kind}_accepted'] += count
+
+    def batch_search(self, kind, centers, work, accepted):
+        # a batched pass of perception.radius_pairs, with the work it did (its *work* dict) spread over one
+        # search per center; its grid cells stand in for chunks
+        self.search(kind, work.get('cells', 0), work.get('scanned', 0), calls=centers)
+        self.accepted(kind, accepted)
+
+    def perceived(self, kind, pairs):
+        self.current[f'perceive_{kind}_pairs'] += pairs
+
+    def end(self):
+        self.last = self.current
+        if self.recorder is not None:
+            self.recorder.record(self.turn, **self.last)
+        return self.last
@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class Patch:
+    '''
+        A square block of a ResourceField's cells, standing in for a Food item: critters see it at its center,
+        weigh it up by amount_left and eat from it with bite(), like any other food.
+    '''
+    __slots__ = ('field', 'index', 'loc')
+
+    def __init__(self, field, index, loc):
+        self.field = field
+        self.index = index
+        self.loc = loc
+
+    @property
+    def amount_left(self):
+        return self.field.patch_amounts()[self.index]
+
+    def bite(self, size):
+        size = min(size, self.amount_left)
+        if size <= 0:   # already eaten up earlier this turn
+            return 0
+        self.field.take(self.index, size)
+        return size
+
+
+class ResourceField:
+    '''
+        Food as a continuous raster rather than Food objects: how much food is in each cell of a
+        resolution*resolution grid over the world. Each turn it regrows logistically toward the cells' capacity,
+        diffuses into neighbouring cells and decays, all as whole-array operations.
+        Critters see it as patches of PATCH*PATCH cells (see Patch), so the cost of a turn and the memory used
+        are set by the resolution, not by how much food there is.
+        Opt in with world.resources = ResourceField(world.size); it works alongside Food objects, not a FoodField.
+    '''
+    PATCH = 4   # cells per side of a patch
+
+    def __init__(self, size, resolution=100, capacity=.5, regrow=.05, diffusion=.1, decay=.01):
+        # capacity: the most food a unit of area holds (at abundance 1)
+        # regrow, decay: per turn rates; diffusion: fraction exchanged with each neighbouring cell per turn
+        if resolution % self.PATCH:
+            raise ValueError(f"resolution must be a multiple of {self.PATCH}")
+        self.size = size
+        self.resolution = resolution
+        self.cell = size / resolution
+        self.capacity = capacity
+        self.regrow = regrow
+        self.diffusion = diffusion
+        self.decay = decay
+        self.grid = np.full((resolution, resolution), capacity * self.cell**2)   # grid[x, y]
+
+        per_side = resolution // self.PATCH
+        centers = (np.arange(per_side) + .5) * self.PATCH * self.cell
+        self.centers = np.stack(np.meshgrid(centers, centers, indexing='ij'), axis=-1).reshape(-1, 2)
+        self.patches = np.empty(len(self.centers), dtype=object)
+        self.patches[:] = [Patch(self, k, loc) for k, loc in enumerate(map(tuple, self.centers.tolist()))]
+        self._amounts = None    # food in each patch, cached until the grid changes
+
+    def patch_amounts(self):
+        if self._amounts is None:
+            per_side = self.resolution // self.PATCH
+            blocks = self.grid.reshape(per_side, self.PATCH, per_side, self.PATCH)
+            self._amounts = blocks.sum(axis=(1, 3)).ravel()
+        return self._amounts
+
+    def total(self):
+        return float(self.grid.sum())
+
+    def live(self):
+        # (patches, centers, amounts) of the patches with food in them
+        amounts = self.patch_amounts()
+        live = np.flatnonzero(amounts > 0)
+        return self.patches[live], self.centers[live], amounts[live]
+
+    def within(self, loc, search_range):
+        # (distance, patch) for every patch with food whose center is within search_range of loc
+        patches, centers, _ = self.live()
+        rho = np.hypot(centers[:,0] - loc[0], centers[:,1] - loc[1])
+        near = np.flatnonzero(rho <= search_range)
+        return list(zip(rho[near].tolist(), patches[near].tolist()))
+
+    def take(self, index, size):
+        # removes *size* food from a patch, in proportion from each of its cells
+        per_side = self.resolution // self.PATCH
+        i, j = divmod(index, per_side)
+        amounts = self.patch_amounts()
+        block = self.grid[i*self.PATCH:(i+1)*self.PATCH, j*self.PATCH:(j+1)*self.PATCH]
+        block *= max(0., 1 - size / amounts[index])
+        amounts[index] = block.sum()
+
+    def step(self, abundance=1):
+        grid = self.grid
+        capacity = abundance * self.capacity * self.cell**2
+        grid += self.regrow * grid * (1 - grid / capacity) if capacity > 0 else -grid
+        edges = np.pad(grid, 1, mode='edge')    # no flow across the world's edges
+        grid += self.diffusion * (edges[:-2,1:-1] + edges[2:,1:-1] + edges[1:-1,:-2] + edges[1:-1,2:] - 4*grid)
+        grid *= 1 - self.decay
+        np.maximum(grid, 0, out=grid)
+        self._amounts = None
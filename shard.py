@@ -0,0 +1,495 @@
+from world import World
+from arrayworld import ArrayWorld, EAT, BREED_SEX, GIVE_BIRTH, DEPART, STARVE, MOVES, SUCCESS, FAILURE, _bites
+from biology import BioAssumptions
+from profiler import StepProfiler
+
+import numpy as np
+import multiprocessing as mp
+import multiprocessing.connection
+import traceback
+
+
+# TRANSPORTS
+
+class Transport:
+    '''
+        How shards reach each other. Every shard gets an endpoint knowing its own rank and the number of shards,
+        with point-to-point send/recv; messages between any two shards arrive in the order they were sent.
+    '''
+    def __init__(self, rank, size):
+        self.rank = rank
+        self.size = size
+
+    @classmethod
+    def mesh(cls, size):
+        # one connected endpoint per shard
+        raise NotImplementedError
+
+    def send(self, dest, message):
+        raise NotImplementedError
+
+    def recv(self, source):
+        raise NotImplementedError
+
+
+class QueueTransport(Transport):
+    '''
+        Stand-in for a network between machines: one multiprocessing queue per ordered pair of shards
+    '''
+    def __init__(self, rank, size, queues):
+        super().__init__(rank, size)
+        self.queues = queues
+
+    @classmethod
+    def mesh(cls, size):
+        queues = [[mp.Queue() if i != j else None for j in range(size)] for i in range(size)]
+        return [cls(rank, size, queues) for rank in range(size)]
+
+    def send(self, dest, message):
+        self.queues[self.rank][dest].put(message)
+
+    def recv(self, source):
+        return self.queues[source][self.rank].get()
+
+
+# SHARDS
+
+class Shard(ArrayWorld):
+    '''
+        One rectangle of a sharded world: an ArrayWorld owning the critters and food inside its bounds.
+        Each turn it lends copies ("ghosts") of everything near its edges to the other shards so their critters
+        can perceive across the boundary, settles meals and matings that cross it, and hands over critters that
+        moved out of its bounds.
+    '''
+    def __init__(self, transport, grid, size=World.SIZE, food_drops=None, seed=None, world_seed=None):
+        super().__init__(size, food_drops, seed)
+        # food comes from the stream World(seed=world_seed) would drop it from, the same in every shard, so they all
+        # draw the whole world's drops alike and each keeps the ones landing in its bounds
+        self.food_rng = np.random.default_rng(np.random.SeedSequence(world_seed).spawn(5)[3])
+        self.transport = transport
+        self.rank = transport.rank
+        self.grid = np.array(grid)
+        self.others = [j for j in range(transport.size) if j != self.rank]
+        self.next_id = self.rank
+        self.lo, self.hi = self.bounds(self.rank)
+
+    def bounds(self, rank):
+        cell = np.array(divmod(rank, self.grid[1]))
+        width = self.size / self.grid
+        return cell * width, (cell+1) * width
+
+    def owner(self, loc):
+        # shard owning each location; the outer shards own whatever has wandered off the edge of the world
+        cell = np.clip(np.floor(loc / (self.size / self.grid)).astype(np.int64), 0, self.grid-1)
+        return cell[:,0] * self.grid[1] + cell[:,1]
+
+    def near(self, rank, loc, halo):
+        # which locations are within *halo* of a shard's bounds
+        lo, hi = self.bounds(rank)
+        lo = np.where(lo > 0, lo - halo, -np.inf)
+        hi = np.where(hi < self.size, hi + halo, np.inf)
+        return np.all((loc >= lo) & (loc <= hi), axis=1)
+
+    def _exchange(self, outgoing):
+        # sends outgoing[j] to every other shard j, and returns what each of them sent here
+        for j in self.others:
+            self.transport.send(j, outgoing[j])
+        return {j: self.transport.recv(j) for j in self.others}
+
+    # ids are interleaved between shards, so they stay unique across the whole world
+    def _append(self, columns):
+        count = len(columns['ids'])
+        first = self.next_id
+        super()._append(columns)
+        self.ids[self.n-count:] = first + np.arange(count) * self.transport.size
+        self.next_id = first + count * self.transport.size
+
+    def _adopt(self, columns):
+        # appends rows that already have ids, i.e. ghosts and critters arriving from another shard
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate([getattr(self, name), columns[name]]))
+        self._rows = None
+
+    def _pack(self, rows):
+        columns = {name: getattr(self, name)[rows] for name in self.COLUMNS}
+        return columns, self.kinds, self.bios, self.trait_names
+
+    def _unpack(self, packed):
+        # the same rows in this shard's layout, whose kinds and trait columns may be numbered differently
+        columns, kinds, bios, trait_names = packed
+        local_kind = np.array([self._register(Species, bio) for Species, bio in zip(kinds, bios)], dtype=np.int16)
+        local = self._blank(len(columns['ids']))
+        for name in self.COLUMNS:
+            if name not in ('kind', 'traits', 'embryo'):
+                local[name][:] = columns[name]
+        if len(local_kind):
+            local['kind'][:] = local_kind[columns['kind']]
+        cols = [self.trait_idx[t] for t in trait_names]
+        local['traits'][:, cols] = columns['traits']
+        local['embryo'][:, cols] = columns['embryo']
+        return local
+
+    def _local_rows(self, ids):
+        # rows of the given ids, -1 for any not held here
+        rows = np.full(len(ids), -1)
+        if self.n:
+            order = np.argsort(self.ids)
+            held = order[np.minimum(np.searchsorted(self.ids, ids, sorter=order), self.n-1)]
+            found = self.ids[held] == ids
+            rows[found] = held[found]
+        return rows
+
+    # ADMIN
+
+    def populate(self, Species, count, bio=BioAssumptions, ages=None):
+        super().populate(Species, count, bio, ages)
+        self.loc[self.n-count:] = self.lo + self.loc[self.n-count:] * ((self.hi - self.lo) / self.size)
+
+    def drop_food(self):
+        # the whole world's drops, keeping those that land here; returns how many were drawn and the
+        # (index among them, food) of the ones kept
+        dropped, kept = 0, []
+        for drop in self.food_drops:
+            adjusted_mean = self.drop_mean(drop)
+            drop_count = max(0, round(self.food_rng.normal(adjusted_mean, adjusted_mean*drop.cv)))
+            locs = self.drop_locs(drop, drop_count)
+            here = np.flatnonzero(self.owner(locs) == self.rank)
+            for i, loc in zip(here.tolist(), locs[here].tolist()):
+                new_food = drop.food(self, loc=tuple(loc))
+                self.avail_food.add(new_food, new_food.loc)
+                kept.append((dropped + i, new_food))
+            dropped += drop_count
+        return dropped, kept
+
+    def set_up_food(self):
+        # with more than one shard, amounts go by the order the food was drawn in rather than by this shard's
+        # roster, so every shard takes as many numbers from the food stream
+        if self.transport.size == 1:
+            return super().set_up_food()
+        if not self.food_drops:
+            self.register_food_drop()
+        temp = self.abundance
+        self.abundance *= 50
+        dropped, kept = self.drop_food()
+        self.abundance = temp
+        fractions = self.food_rng.random(dropped)
+        for i, food in kept:
+            food.amount_left = fractions[i] * food.DEFAULT_AMOUNT
+
+    def step(self):
+        # the ArrayWorld turn, with four rounds of messages: ghosts, then decisions and claims on food across
+        # the boundary, then the bites taken from that food, then critters changing hands
+
+        self.turn += 1
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start(self.turn)
+
+        self.expire_food()
+        if profiler is not None:
+            profiler.lap('food')
+        self.drop_food()
+        if profiler is not None:
+            profiler.lap('drop_food')
+
+        self.age += 1
+        self.gestation -= 1
+
+        foods = self.all_food
+        food_loc = np.array([f.loc for f in foods], dtype=float).reshape(-1, 2)
+        food_amount = np.array([f.amount_left for f in foods], dtype=float)
+        own = self.n
+
+        # ghosts of everything another shard's critters might perceive
+        reach = max(self.trait('per_critter').max(initial=0), self.trait('per_food').max(initial=0))
+        halo = max([reach, *self._exchange({j: reach for j in self.others}).values()])
+        lent, lent_food = {}, {}
+        for j in self.others:
+            lent[j] = np.flatnonzero(self.near(j, self.loc, halo))
+            lent_food[j] = np.flatnonzero(self.near(j, food_loc, halo))
+        borrowed = self._exchange({j: (self._pack(lent[j]), food_loc[lent_food[j]], food_amount[lent_food[j]],
+                                       lent_food[j]) for j in self.others})
+        ghosts = {}
+        food_owner = [np.full(len(foods), self.rank)]
+        food_index = [np.arange(len(foods))]
+        all_food_loc, all_food_amount = [food_loc], [food_amount]
+        for j, (packed, loc, amount, index) in borrowed.items():
+            start = self.n
+            self._adopt(self._unpack(packed))
+            ghosts[j] = np.arange(start, self.n)
+            food_owner.append(np.full(len(index), j))
+            food_index.append(index)
+            all_food_loc.append(loc)
+            all_food_amount.append(amount)
+        food_owner, food_index = np.concatenate(food_owner), np.concatenate(food_index)
+
+        wander_phi = np.zeros(self.n)
+        wander_phi[:own] = self.wander_rng.vonmises(self.heading[:own], self.trait('wander_faith', slice(own)))
+        decision, rho, phi, target = self._decide(np.concatenate(all_food_loc), np.concatenate(all_food_amount),
+                                                  wander_phi)
+        mine = np.arange(self.n) < own
+        if profiler is not None:
+            profiler.count_decision_values(decision[:own])
+            profiler.lap('decide')
+
+        # the owners' own decisions for the ghosts, and claims on other shards' food
+        eating = np.flatnonzero(mine & (decision == EAT))
+        if len(eating):
+            turn_order = np.empty(own, np.int64)
+            turn_order[self.order_rng.permutation(own)] = np.arange(own)
+            eating = eating[np.lexsort((turn_order[eating], target[eating]))]
+            order = turn_order[eating] / own
+        else:
+            order = np.zeros(0)
+        hunger = self.max_energy[eating] - self.energy[eating]
+        eater_owner = food_owner[target[eating]]
+        outgoing = {}
+        for j in self.others:
+            mating = decision[lent[j]] == BREED_SEX
+            mate_ids = np.full(len(lent[j]), -1)
+            mate_ids[mating] = self.ids[target[lent[j]][mating]]
+            claims = eater_owner == j
+            outgoing[j] = (decision[lent[j]], mate_ids,
+                           (food_index[target[eating[claims]]], hunger[claims], order[claims], self.ids[eating[claims]]))
+        replies = self._exchange(outgoing)
+        for j, (ghost_decision, mate_ids, _) in replies.items():
+            decision[ghosts[j]] = ghost_decision
+            target[ghosts[j]] = np.where(mate_ids >= 0, self._local_rows(mate_ids), -1)
+
+        # meals from this shard's food, shared between its own critters and other shards' claims in turn order
+        local = eater_owner == self.rank
+        claim_food = [food_index[target[eating[local]]]]
+        claim_hunger, claim_order = [hunger[local]], [order[local]]
+        for j, (_, _, (food, hunger_j, order_j, ids)) in replies.items():
+            claim_food.append(food)
+            claim_hunger.append(hunger_j)
+            claim_order.append(order_j)
+        claim_food = np.concatenate(claim_food).astype(np.int64)
+        bite = _bites(claim_food, np.concatenate(claim_hunger), np.concatenate(claim_order), food_amount)
+        self._bite_food(foods, claim_food, bite)
+        self._feed(eating[local], bite[:local.sum()])
+        sizes = np.cumsum([local.sum()] + [len(replies[j][2][3]) for j in self.others])
+        served = self._exchange({j: (replies[j][2][3], bite[a:b]) for j, a, b in zip(self.others, sizes, sizes[1:])})
+        for ids, bites in served.values():
+            self._feed(self._local_rows(ids), bites)
+
+        # the rest of the turn only for critters owned here
+        moving = np.flatnonzero(mine & np.isin(decision, MOVES))
+        self._move_rows(moving, rho, phi)
+
+        result = np.full(self.n, SUCCESS, np.int8)
+        courting = np.flatnonzero(mine & (decision == BREED_SEX))
+        mate = target[courting]
+        mutual = (decision[mate] == BREED_SEX) & (target[mate] == courting)
+        result[courting[~mutual]] = FAILURE
+        self._breed(courting[mutual], mate[mutual])
+
+        births = self._births(np.flatnonzero(mine & (decision == GIVE_BIRTH)))
+
+        self.last_decision = decision
+        self.last_result = result
+        self._keep(mine & (decision != DEPART) & (decision != STARVE))
+        self._append(births)
+        self.avail_food.compact()
+
+        # hand over critters that left this shard's bounds
+        owner = self.owner(self.loc)
+        arrivals = self._exchange({j: self._pack(np.flatnonzero(owner == j)) for j in self.others})
+        self._keep(owner == self.rank)
+        for j in self.others:
+            self._adopt(self._unpack(arrivals[j]))
+        if self.turn % self.REBUCKET_EVERY == 0:
+            self.tune_chunks()
+        if profiler is not None:
+            profiler.lap('resolve')
+            profiler.end()
+
+    def summary(self):
+        # per species: how many critters this shard owns, and the sum of each of their traits
+        summary = {}
+        for kind, Species in enumerate(self.kinds):
+            extant = self.kind == kind
+            summary[Species] = (int(extant.sum()), {t: float(self.trait(t, extant).sum()) for t in Species.START_TRAITS})
+        return summary
+
+
+def _serve(control, transport, grid, size, food_drops, seed, world_seed):
+    # a shard's process: runs whatever the ShardedWorld asks of it, in lockstep with the other shards, and replies
+    # ('ok', result), or ('error', traceback) before giving up
+    try:
+        shard = Shard(transport, grid, size, food_drops, seed, world_seed)
+        while True:
+            name, args = control.recv()
+            if name is None:
+                break
+            control.send(('ok', getattr(shard, name)(*args)))
+    except Exception:
+        control.send(('error', traceback.format_exc()))
+
+
+class ShardedWorld:
+    '''
+        A world split over a grid of Shards, each in its own process, talking over a pluggable Transport.
+        Critters behave as in ArrayWorld, so with a single shard a run matches ArrayWorld exactly; with more, food
+        still lands where it would in ArrayWorld but each shard draws its own random numbers for its critters, so
+        runs agree with a single process statistically rather than turn for turn.
+    '''
+    def __init__(self, grid=(2,2), size=World.SIZE, food_drops=None, seed=None, transport=QueueTransport):
+        self.grid = tuple(grid)
+        self.size = size
+        self.turn = 0
+        self._profiler = None
+        count = self.grid[0] * self.grid[1]
+        world_seed = np.random.SeedSequence(seed).entropy    # fixed here, so every shard agrees on it
+        seeds = [world_seed] if count == 1 else np.random.SeedSequence(world_seed).spawn(count)
+        self.placement_rng = np.random.default_rng(np.random.SeedSequence(world_seed).spawn(count+1)[-1])
+        self.shares = np.full(count, 1/count)
+        self.controls = []
+        self.processes = []
+        for rank, endpoint in enumerate(transport.mesh(count)):
+            control, shard_end = mp.Pipe()
+            process = mp.Process(target=_serve, daemon=True,
+                                 args=(shard_end, endpoint, self.grid, size, food_drops, seeds[rank], world_seed))
+            process.start()
+            shard_end.close()   # only the shard's copy left, so the pipe reads as closed if the shard dies
+            self.controls.append(control)
+            self.processes.append(process)
+
+    def _gather(self):
+        # every shard's reply, in rank order. A shard failing stops them all, since the others would wait for it
+        # forever at their next exchange
+        replies = {}
+        while len(replies) < len(self.controls):
+            pending = [control for control in self.controls if control not in replies]
+            for control in mp.connection.wait(pending):
+                try:
+                    status, reply = control.recv()
+                except EOFError:
+                    status, reply = 'error', "the shard's process died\n"
+                if status == 'error':
+                    self.terminate()
+                    raise RuntimeError(f"shard {self.controls.index(control)} failed:\n{reply}")
+                replies[control] = reply
+        return [replies[control] for control in self.controls]
+
+    def _send(self, control, name, *args):
+        try:
+            control.send((name, args))
+        except BrokenPipeError:
+            pass    # the shard's gone; _gather reports it
+
+    def _call(self, name, *args):
+        for control in self.controls:
+            self._send(control, name, *args)
+        return self._gather()
+
+    @property
+    def abundance(self):
+        return self._call('__getattribute__', 'abundance')[0]
+
+    @abundance.setter
+    def abundance(self, value):
+        self._call('__setattr__', 'abundance', value)
+
+    @property
+    def resources(self):
+        return None
+
+    @resources.setter
+    def resources(self, value):
+        if value is not None:
+            raise NotImplementedError("sharded worlds don't run resource fields")
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, value):
+        # each shard profiles its own steps; step() merges their records into this one
+        self._profiler = value
+        self._call('__setattr__', 'profiler', None if value is None else StepProfiler())
+
+    @property
+    def pop_count(self):
+        return sum(self._call('__getattribute__', 'n'))
+
+    @property
+    def food_count(self):
+        return sum(self._call('__getattribute__', 'food_count'))
+
+    @property
+    def food_energy(self):
+        return sum(self._call('__getattribute__', 'food_energy'))
+
+    def set_up_food(self):
+        self._call('set_up_food')
+
+    def populate(self, Species, count, bio=BioAssumptions, ages=None):
+        # spread over the shards in proportion to their area
+        counts = self.placement_rng.multinomial(count, self.shares) if len(self.shares) > 1 else [count]
+        ages = np.zeros(count, dtype=int) if ages is None else np.asarray(ages)
+        bounds = np.cumsum([0, *counts])
+        for control, a, b in zip(self.controls, bounds, bounds[1:]):
+            self._send(control, 'populate', Species, b-a, bio, ages[a:b])
+        self._gather()
+
+    def step(self):
+        self.turn += 1
+        self._call('step')
+        if self._profiler is not None:
+            # the slowest shard's time for each phase, and everything else summed
+            records = [shard.last for shard in self._call('__getattribute__', 'profiler')]
+            self._profiler.start(self.turn)
+            for field in StepProfiler.FIELDS:
+                values = [record[field] for record in records]
+                self._profiler.current[field] = max(values) if field.startswith('time_') else sum(values)
+            self._profiler.end()
+
+    def population_summary(self):
+        # the shards' figures combined, as ArrayWorld.population_summary gives them for the whole population
+        summaries = [summary for summary in self._call('population_summary') if summary['pop']]
+        pop = sum(summary['pop'] for summary in summaries)
+        if not pop:
+            return {'pop': 0}
+        mean = lambda name: sum(summary[name] * summary['pop'] for summary in summaries) / pop
+        return {
+            'pop': pop,
+            'avg_age': mean('avg_age'),
+            'avg_generation': mean('avg_generation'),
+            'max_generation': max(summary['max_generation'] for summary in summaries),
+            'avg_energy': mean('avg_energy'),
+        }
+
+    def summary(self):
+        # per species, the number of critters and the mean of each trait over every shard
+        total = {}
+        for summary in self._call('summary'):
+            for Species, (count, sums) in summary.items():
+                old_count, old_sums = total.get(Species, (0, dict.fromkeys(sums, 0)))
+                total[Species] = (old_count + count, {t: old_sums[t] + s for t, s in sums.items()})
+        return {Species: (count, {t: s / count for t, s in sums.items()} if count else None)
+                for Species, (count, sums) in total.items()}
+
+    def report(self):
+        for Species, (count, means) in self.summary().items():
+            print(f"\n{Species.__name__}")
+            if count:
+                for trait, mean in means.items():
+                    print(f"\t{trait}: {mean:.2f}")
+            else:
+                print("No surviving critters")
+
+    def terminate(self):
+        # stops every shard at once, whatever it's doing
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+
+    def close(self):
+        for control, process in zip(self.controls, self.processes):
+            if process.is_alive():
+                control.send((None, ()))
+        for process in self.processes:
+            process.join()
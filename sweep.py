@@ -0,0 +1,149 @@
+from world import World
+from arrayworld import ArrayWorld
+from critter import Critter
+from datavis import MetricsRecorder
+
+import argparse
+import csv
+import numpy as np
+from itertools import product
+from multiprocessing import Pool
+from time import perf_counter
+
+ENGINES = {'World': World, 'ArrayWorld': ArrayWorld}
+
+# settings every job has, and their defaults (the ones world.run uses)
+DEFAULTS = {
+    'engine': 'World',
+    'size': World.SIZE,
+    'abundance': .6,
+    'start_pop': 50,
+    'turns': 1000,
+    'seed': 0,
+}
+
+METRICS = ('pop', 'avg_age', 'avg_generation', 'max_generation', 'avg_energy', 'food_energy')
+
+
+def grid(traits=None, **axes):
+    # every combination of the given settings, e.g. grid(abundance=[.3, .6], start_pop=[50, 200]);
+    # traits maps Critter START_TRAITS to the values to try for them
+    traits = traits or {}
+    names = list(axes) + list(traits)
+    for values in product(*axes.values(), *traits.values()):
+        job = dict(zip(names[:len(axes)], values[:len(axes)]))
+        job['traits'] = dict(zip(names[len(axes):], values[len(axes):]))
+        yield job
+
+
+def replicate(jobs, replicates, first_seed=0):
+    # each job once per seed
+    for job in jobs:
+        for seed in range(first_seed, first_seed + replicates):
+            yield {**job, 'seed': seed}
+
+
+def run_job(job):
+    # one headless run; returns the settings, speed and per-turn metrics of the run
+    settings = {**DEFAULTS, **job}
+    traits = settings.get('traits') or {}
+    unknown = set(settings) - set(DEFAULTS) - {'traits'} | set(traits) - set(Critter.START_TRAITS)
+    if unknown:
+        raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+
+    Species = Critter
+    if traits:
+        Species = type('Critter', (Critter,), {'START_TRAITS': dict(traits)})
+    world = ENGINES[settings['engine']](size=settings['size'], seed=settings['seed'])
+    world.abundance = settings['abundance']
+    world.set_up_food()
+    start_pop = settings['start_pop']
+    world.populate(Species, start_pop, ages=world.placement_rng.integers(0, Species.MAX_AGE, start_pop, endpoint=True))
+
+    data = MetricsRecorder(fields=METRICS)
+    start = perf_counter()
+    while world.turn < settings['turns'] and world.pop_count > 0:
+        record(world, data)
+        world.step()
+    elapsed = perf_counter() - start
+    data.close()
+    rows = data.columns()
+    turns = rows['turn'].tolist()
+
+    return {
+        'settings': settings,
+        'turns_run': world.turn,
+        'seconds': elapsed,
+        'turns_per_sec': world.turn / elapsed if elapsed else float('inf'),
+        # turn -> value of each metric, leaving out turns without one (e.g. the averages of an empty population)
+        'metrics': {name: {turn: value for turn, value in zip(turns, rows[name].tolist()) if not np.isnan(value)}
+                    for name in METRICS},
+    }
+
+
+def record(world, data):
+    # the metrics world.run keeps
+    data.record(world.turn, **world.population_summary(), food_energy=world.food_energy)
+
+
+def sweep(jobs, processes=None):
+    # runs the jobs across a pool of processes, returning their results in the order given
+    jobs = list(jobs)
+    with Pool(processes) as pool:
+        return pool.map(run_job, jobs, chunksize=1)
+
+
+def table(results):
+    # one row per job per recorded turn, with the job's settings and speed on every row
+    rows = []
+    for job, result in enumerate(results):
+        settings = dict(result['settings'])
+        traits = settings.pop('traits') or {}
+        common = {'job': job, **settings, **traits, 'turns_run': result['turns_run'],
+                  'turns_per_sec': result['turns_per_sec']}
+        metrics = result['metrics']
+        for turn in sorted(metrics['pop']):
+            rows.append({**common, 'turn': turn, **{name: metrics[name].get(turn) for name in METRICS}})
+    return rows
+
+
+def write_csv(rows, path):
+    columns = list(dict.fromkeys(name for row in rows for name in row))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a grid of headless simulations across a process pool.")
+    parser.add_argument('--engine', nargs='+', choices=list(ENGINES), default=[DEFAULTS['engine']])
+    parser.add_argument('--size', nargs='+', type=int, default=[DEFAULTS['size']])
+    parser.add_argument('--abundance', nargs='+', type=float, default=[DEFAULTS['abundance']])
+    parser.add_argument('--start-pop', nargs='+', type=int, default=[DEFAULTS['start_pop']])
+    parser.add_argument('--turns', nargs='+', type=int, default=[DEFAULTS['turns']])
+    parser.add_argument('--trait', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="Critter starting trait values to try; may be repeated")
+    parser.add_argument('--replicates', type=int, default=1, help="seeds per combination")
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'], help="first seed")
+    parser.add_argument('--processes', type=int, default=None, help="default: one per core")
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args(argv)
+
+    traits = {}
+    for spec in args.trait:
+        name, _, values = spec.partition('=')
+        traits[name] = [float(v) for v in values.split(',')]
+    jobs = list(replicate(grid(traits, engine=args.engine, size=args.size, abundance=args.abundance,
+                               start_pop=args.start_pop, turns=args.turns), args.replicates, args.seed))
+
+    print(f"running {len(jobs)} jobs")
+    start = perf_counter()
+    results = sweep(jobs, args.processes)
+    for job, result in enumerate(results):
+        print(f"{job}: {result['turns_run']} turns at {result['turns_per_sec']:.2f} turns/sec")
+    write_csv(table(results), args.out)
+    print(f"done in {perf_counter() - start:.1f}s, results in {args.out}")
+
+if __name__=='__main__':
+    main()
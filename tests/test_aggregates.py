@@ -0,0 +1,36 @@
+from critter import Critter
+from world import World
+
+import numpy as np
+
+
+def brute_force(world):
+    critters = world.all_critters
+    return (np.mean([c.age for c in critters]), np.mean([c.energy for c in critters]),
+            np.mean([c.genome for c in critters], axis=0))
+
+
+def test_running_totals_match_a_recount():
+    world = World(seed=0)
+    world.abundance = .6
+    world.set_up_food()
+    world.populate(Critter, 50, ages=world.placement_rng.integers(0, Critter.MAX_AGE, 50))
+    for _ in range(2*World.REBASE_EVERY + 10):
+        world.step()
+        summary = world.population_summary()
+        age, energy, traits = brute_force(world)
+        assert summary['avg_age'] == age
+        assert np.isclose(summary['avg_energy'], energy, rtol=1e-9)
+        assert np.allclose(list(world.stats[Critter].trait_means().values()), traits, rtol=1e-9)
+
+
+def test_rebase_clears_drift():
+    world = World(seed=1)
+    world.populate(Critter, 20)
+    stats = world.stats[Critter]
+    stats.energy += 1e-3
+    stats.traits += 1e-3
+    world.rebase_stats()
+    age, energy, traits = brute_force(world)
+    assert stats.mean('energy') == energy
+    assert np.allclose(list(stats.trait_means().values()), traits, rtol=0, atol=1e-12)
@@ -0,0 +1,40 @@
+from arrayworld import ArrayWorld
+from food import Food
+from resourcefield import ResourceField
+from shard import ShardedWorld
+
+import pytest
+
+
+def test_steps_without_critters():
+    world = ArrayWorld(seed=0)
+    world.set_up_food()
+    for _ in range(60):
+        world.step()
+    assert world.pop_count == 0 and world.food_count > 0
+
+
+def test_shards_step_without_critters():
+    world = ShardedWorld(grid=(1,2), seed=0)
+    try:
+        world.set_up_food()
+        for _ in range(3):
+            world.step()
+        assert world.pop_count == 0 and world.food_count > 0
+    finally:
+        world.close()
+
+
+def test_resources_refused_with_a_food_field():
+    world = ArrayWorld(food_field=True)
+    with pytest.raises(ValueError):
+        world.resources = ResourceField(world.size)
+    ArrayWorld().resources = ResourceField(world.size)
+
+
+def test_food_field_checks_constructor_drops():
+    class Lasting(Food):
+        DECAY = 0
+    with pytest.raises(TypeError):
+        ArrayWorld(food_drops=[(Lasting,)], food_field=True)
+    ArrayWorld(food_drops=[(Lasting,)])
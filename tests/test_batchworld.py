@@ -0,0 +1,21 @@
+from batchworld import BatchWorld
+from critter import Critter
+from resourcefield import ResourceField
+
+import pytest
+
+
+def test_critters_go_into_the_given_replica():
+    world = BatchWorld(3, seed=0)
+    world.add_critters([Critter(world), Critter(world)], replica=2)
+    world.add_critter(Critter(world))
+    world.populate(Critter, 4, replica=1)
+    assert world.replica_pop().tolist() == [1, 4, 2]
+    with pytest.raises(ValueError):
+        world.add_critter(Critter(world), replica=3)
+
+
+def test_resources_refused():
+    world = BatchWorld(2)
+    with pytest.raises(ValueError):
+        world.resources = ResourceField(world.size)
@@ -0,0 +1,36 @@
+from datavis import MetricsRecorder
+
+import os
+import pytest
+
+
+def test_columns_after_close(tmp_path):
+    path = str(tmp_path / 'run.metrics')
+    data = MetricsRecorder(path, buffer_rows=4)
+    for turn in range(10):
+        data.record(turn, pop=turn)
+    data.close()
+    data.close()
+    assert data.columns()['pop'].tolist() == list(range(10))
+    assert os.path.exists(path)
+
+
+def test_temporary_file_removed_on_close():
+    data = MetricsRecorder(buffer_rows=4)
+    for turn in range(10):
+        data.record(turn, pop=turn, food_energy=2*turn)
+    path = data.path
+    data.close()
+    assert not os.path.exists(path) and not os.path.exists(f"{path}.json")
+    assert data.columns()['food_energy'].tolist() == [2*turn for turn in range(10)]
+
+
+def test_no_records_after_close(tmp_path):
+    data = MetricsRecorder(str(tmp_path / 'run.metrics'))
+    data.record(0, pop=1)
+    data.close()
+    with pytest.raises(ValueError):
+        data.record(1, pop=2)
+    with pytest.raises(ValueError):
+        data.flush()
+    assert len(data) == 1 == len(data.columns())
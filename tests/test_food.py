@@ -0,0 +1,15 @@
+from food import Food
+from world import World
+
+
+def test_empty_food_is_untracked():
+    world = World(seed=0)
+    empty = Food(world, amount=0, loc=(10., 10.))
+    emptied = Food(world, loc=(20., 20.))
+    for food in (empty, emptied):
+        world.avail_food.add(food, food.loc)
+    emptied.amount_left = 0
+    Food(world, amount=0)   # never dropped
+    world.step()
+    assert empty not in world.avail_food and emptied not in world.avail_food
+    assert world.food_count == 0
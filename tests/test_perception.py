@@ -0,0 +1,16 @@
+from perception import PairTable
+import util
+
+import numpy as np
+
+
+def test_bearings_match_rel_phi():
+    points = np.random.default_rng(0).random((40, 2)) * 50
+    points[5] = points[4]   # e.g. a newborn and its parent
+    points[6] = points[4]
+    table = PairTable(points, 20)
+    for k in range(len(points)):
+        others, _, phis = table.view(k)
+        for other, phi in zip(others.tolist(), phis.tolist()):
+            assert np.isclose(phi, util.rel_phi(tuple(points[k]), tuple(points[other])), rtol=0, atol=1e-12)
+    assert table.view(5)[2][table.view(5)[0] == 4] == 0
@@ -0,0 +1,21 @@
+from arrayworld import ArrayWorld
+from critter import Critter
+from profiler import StepProfiler
+from world import World
+
+import pytest
+
+
+@pytest.mark.parametrize('World_class', [World, ArrayWorld])
+def test_perception_reports_its_search_work(World_class):
+    world = World_class(seed=3)
+    world.set_up_food()
+    world.populate(Critter, 60)
+    world.profiler = StepProfiler()
+    world.step()
+    record = world.profiler.last
+    for kind in StepProfiler.SEARCHES:
+        assert record[f'search_{kind}_calls'] > 0
+        assert record[f'search_{kind}_chunks'] > 0
+        assert record[f'search_{kind}_scanned'] >= record[f'search_{kind}_accepted'] > 0
+        assert record[f'search_{kind}_accepted'] == record[f'perceive_{kind}_pairs']
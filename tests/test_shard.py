@@ -0,0 +1,69 @@
+from arrayworld import ArrayWorld
+from critter import Critter
+from shard import ShardedWorld
+
+import numpy as np
+import pytest
+
+
+def run(world, turns, pop=200, abundance=.6):
+    world.abundance = abundance
+    world.set_up_food()
+    world.populate(Critter, pop, ages=np.random.default_rng(0).integers(0, Critter.MAX_AGE, pop))
+    pops = []
+    for _ in range(turns):
+        world.step()
+        pops.append(world.pop_count)
+    return pops
+
+
+def test_single_shard_matches_arrayworld():
+    world = ShardedWorld(grid=(1,1), seed=5)
+    try:
+        assert run(world, 40) == run(ArrayWorld(seed=5), 40)
+    finally:
+        world.close()
+
+
+@pytest.mark.parametrize('grid', [(1,2), (2,2)])
+def test_shards_run_past_matings_across_the_boundary(grid):
+    # few critters among plenty of food, so lent critters' targets include food indices past the last row
+    world = ShardedWorld(grid=grid, seed=0)
+    try:
+        pops = run(world, 80, pop=50, abundance=1)
+        summary = world.population_summary()
+        assert summary['pop'] == pops[-1]
+        assert summary['max_generation'] >= 1
+        assert world.food_energy > 0
+    finally:
+        world.close()
+
+
+def test_every_shard_gets_food():
+    world = ShardedWorld(grid=(2,2), seed=1)
+    try:
+        world.set_up_food()
+        world.populate(Critter, 20)
+        for _ in range(5):
+            world.step()
+        assert all(count > 0 for count in world._call('__getattribute__', 'food_count'))
+    finally:
+        world.close()
+
+
+def test_shard_errors_reach_the_parent():
+    world = ShardedWorld(grid=(1,2), seed=0)
+    try:
+        with pytest.raises(RuntimeError, match="AttributeError"):
+            world._call('__getattribute__', 'no_such_attribute')
+    finally:
+        world.close()
+
+
+def test_resources_are_refused():
+    world = ShardedWorld(grid=(1,1), seed=0)
+    try:
+        with pytest.raises(NotImplementedError):
+            world.resources = object()
+    finally:
+        world.close()
@@ -1,5 +1,6 @@
 from math import hypot, atan2, cos, sin, pi
 from random import uniform
+import numpy as np
 
 # arithmetic
 
@@ -50,6 +51,11 @@ def angle(phi, psi):
     else:
         return dif
 
+def angles(phi, psi):
+    # angle() over arrays
+    dif = np.abs(phi - psi)
+    return np.where(dif > pi, 2*pi - dif, dif)
+
 def wrap_angle(phi):
     # convert angle to [0, 2pi)
     return phi - 2*pi * (phi//(2*pi))
@@ -1,9 +1,17 @@
 from critter import Critter, Decisions, Results
 from food import Food
-from datavis import Data
-
-from random import random, randint, sample, gauss
+from biology import BioAssumptions
+from datavis import MetricsRecorder
+import perception
+from chunks import ChunkMap, FoodIndex, best_chunk_size
+from aggregates import SpeciesStats
+from drops import FoodDrop, Fertility
+
+import numpy as np
 from math import inf as INF, ceil
+from collections import defaultdict
+from itertools import count
+import heapq
 
 class World:
 
@@ -11,122 +19,307 @@ class World:
 
     SIZE = 200                  # side length of square in which food can drop
     TURN_DURATION = 10          # affects the "resolution" of the sim; lower numbers mean fewer things happening per turn
-    CHUNK_SIZE = 30             # quick n dirty testing suggests this is ~optimal
+    CHUNK_SIZE = 30             # starting chunk size; retuned to the population every REBUCKET_EVERY turns
+    REBUCKET_EVERY = 50
+    REBUCKET_SLACK = .2         # only re-bucket for a chunk size at least this much (relatively) different
+    REBASE_EVERY = 50           # turns between summing the species' running totals afresh (see rebase_stats)
 
-    def __init__(self, size=SIZE, food_drops=[]):
+    def __init__(self, size=SIZE, food_drops=None, seed=None):
         self.size = size
         self.abundance = 1              # multiplier for mean food per area (useful for modifying food scarcity over time)
-        self.food_drops = food_drops    # list of triplets: (constructor, mean drops/area/time, coefficient of variation)
+        self.food_drops = [FoodDrop(*drop) for drop in food_drops or []]    # see drops.FoodDrop
         self.turn = 0
         self.species = set()
+        self.stats = {}     # Species -> SpeciesStats of its living critters
+        self.profiler = None    # a profiler.StepProfiler, when instrumenting step
+        self.resources = None   # a resourcefield.ResourceField, for food as a raster as well as (or instead of) Food
+
+        # all randomness comes from here, one independent stream per subsystem, so a run is repeatable from its seed
+        # and e.g. adding a critter doesn't shift where food lands
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        order, wander, mutation, food, placement = (np.random.default_rng(s) for s in self.seed.spawn(5))
+        self.order_rng = order            # turn order
+        self.wander_rng = wander          # wander headings
+        self.mutation_rng = mutation      # offspring genomes
+        self.food_rng = food              # food drop counts, positions and amounts
+        self.placement_rng = placement    # new critters' positions, headings and ages
+        self._wander_headings = {}        # critter -> this turn's pre-drawn wander heading
+        self.food_expiry = []             # heap of (turn, tiebreak, food) for when food decays away
+        self._expiry_order = count()
         
-        self.critters = {}      # critters that exist in the world, by chunk
-        self.avail_food = {}    # food that actually exists in the world, by chunk
+        self.critters = ChunkMap(self.size, self.CHUNK_SIZE)     # critters that exist in the world, by chunk
+        self.avail_food = FoodIndex(self.size, self.CHUNK_SIZE)  # food that actually exists in the world, by chunk
 
         self.decisions = {}     # registers each critter's decision each turn
         self.results = {}       # registers results during and after resolving turn
-        
-        for x in range(int(self.SIZE/self.CHUNK_SIZE) + 1):
-            for y in range(int(self.SIZE/self.CHUNK_SIZE) + 1):
-                self.critters[(x,y)] = []
-                self.avail_food[(x,y)] = []
+        self.conceptions = []   # (parent, mate or None) for each breeding this turn
 
+    # rosters are cached by the chunk maps and only rebuilt (in one pass) after they change
     @property
     def all_critters(self):
-        return [critter for chunk in self.critters.values() for critter in chunk]
+        return self.critters.roster
                 
     @property
     def pop_count(self):
-        return sum([len(chunk) for chunk in self.critters.values()])
+        return len(self.critters)
 
     @property
     def all_food(self):
-        return [food for chunk in self.avail_food.values() for food in chunk]
+        return self.avail_food.roster
 
     @property
     def food_count(self):
-        return sum([len(chunk) for chunk in self.avail_food.values()])
+        return len(self.avail_food)
 
-    def add_critters(self, critters):
-        for critter in critters:
-            self.add_critter(critter)
+    @property
+    def food_energy(self):
+        energy = sum(f.amount_left for f in self.all_food)
+        if self.resources is not None:
+            energy += self.resources.total()
+        return energy
+
+    def populate(self, Species, count, bio=BioAssumptions, ages=None):
+        # adds *count* new critters with the species' starting traits, their derived stats worked out in one batch
+        genomes = np.tile(Species.SCHEMA.defaults, (count, 1))
+        derived = bio.derive_batch(Species, genomes, self)
+        ages = np.zeros(count, dtype=int) if ages is None else np.asarray(ages)
+        locs = self.placement_rng.random((count, 2)) * self.size
+        self.add_critters([Species(self, loc=tuple(loc), age=int(age), bio=bio, genome=genome, derived=stats)
+                            for genome, stats, age, loc in zip(genomes, derived, ages, locs.tolist())])
 
     def add_critter(self, critter):
-        self.critters[self.chunk_idx(critter.loc)].append(critter)
+        self.critters.add(critter, critter.loc)
         self.species.add(critter.__class__)
+        stats = self.stats.get(critter.__class__)
+        if stats is None:
+            stats = self.stats[critter.__class__] = SpeciesStats(critter.__class__)
+        stats.add(critter)
+        critter._stats = stats
 
     def add_critters(self, critters):
         for critter in critters:
             self.add_critter(critter)
 
     # CHUNKS
+    # removals are tombstoned and only compacted at the end of each step
     def relocate(self, critter, new_loc):
-        self.critters[self.chunk_idx(critter.loc)].remove(critter)
-        self.critters[self.chunk_idx(new_loc)].append(critter)
+        self.critters.move(critter, critter.loc, new_loc)
 
     def untrack_critter(self, critter):
-        self.critters[self.chunk_idx(critter.loc)].remove(critter)
-        critter.wipe_caches()
+        if critter not in self.critters.dead:
+            self.critters.remove(critter, critter.loc)
+            critter._stats.remove(critter)
+            critter._stats = None
+            critter.wipe_caches()
 
     def untrack_food(self, food):
-        self.avail_food[self.chunk_idx(food.loc)].remove(food)
+        self.avail_food.remove(food, food.loc)
 
     def chunk_normalize(self, coord):
-        coord = max(0, min(self.SIZE, coord))
-        return int(coord/self.CHUNK_SIZE)
+        return self.critters.chunk_normalize(coord)
             
     def chunk_idx(self, loc):
-        x,y = loc
-        return self.chunk_normalize(x), self.chunk_normalize(y)
+        return self.critters.chunk_idx(loc)
     
     def search_critters(self, loc, search_range):
-        x,y = loc
-        up_idx =    self.chunk_normalize(y+search_range)
-        down_idx =  self.chunk_normalize(y-search_range)
-        right_idx = self.chunk_normalize(x+search_range)
-        left_idx =  self.chunk_normalize(x-search_range)
-        return [c for i in range(left_idx, right_idx+1) for j in range(down_idx, up_idx+1) for c in self.critters[(i,j)]]
+        found = self.critters.search(loc, search_range)
+        if self.profiler is not None:
+            self.profiler.search('critters', self.critters.chunks_spanned(loc, search_range), len(found))
+        return found
     
     def search_food(self, loc, search_range):
-        x,y = loc
-        up_idx =    self.chunk_normalize(y+search_range)
-        down_idx =  self.chunk_normalize(y-search_range)
-        right_idx = self.chunk_normalize(x+search_range)
-        left_idx =  self.chunk_normalize(x-search_range)
-        return [f for i in range(left_idx, right_idx+1) for j in range(down_idx, up_idx+1) for f in self.avail_food[(i,j)]]
+        found = self.avail_food.search(loc, search_range)
+        if self.profiler is not None:
+            self.profiler.search('food', self.avail_food.chunks_spanned(loc, search_range), len(found))
+        return found
+
+    def food_within(self, loc, search_range):
+        # (distance, food) for the food within search_range of loc
+        rows = self.avail_food.rows(loc, search_range)
+        found = self.avail_food.within(loc, search_range, rows)
+        if self.resources is not None:
+            found += self.resources.within(loc, search_range)
+        if self.profiler is not None:
+            self.profiler.search('food', self.avail_food.chunks_spanned(loc, search_range), len(rows))
+            self.profiler.accepted('food', len(found))
+        return found
+
+    def visible_foods(self):
+        # (foods, locs) of everything critters can see and eat: Food, then any resource patches
+        foods, food_locs = self.avail_food.packed()
+        if self.resources is not None:
+            patches, centers, _ = self.resources.live()
+            foods, food_locs = np.concatenate([foods, patches]), np.concatenate([food_locs, centers])
+        return foods, food_locs
+
+    def perception_radii(self):
+        # per_critter and per_food of every living critter, i.e. the radii of their range searches
+        critters = self.all_critters
+        return (np.array([c.per_critter for c in critters], dtype=float),
+                np.array([c.per_food for c in critters], dtype=float))
+
+    def tune_chunks(self):
+        # re-buckets each chunk map when a clearly cheaper chunk size (see chunks.best_chunk_size) has emerged
+        # from the evolving perception ranges and the map's current density
+        per_critter, per_food = self.perception_radii()
+        self._tune(self.critters, per_critter)
+        self._tune(self.avail_food, per_food)
+
+    def _tune(self, things, radii):
+        best = best_chunk_size(self.size, len(things), radii)
+        if abs(best - things.chunk_size) > self.REBUCKET_SLACK * things.chunk_size:
+            things.rebucket(best)
+
+    def rebase_stats(self):
+        # re-sums every species' running totals, before the rounding error in them adds up
+        critters = {Species: [] for Species in self.stats}
+        for critter in self.all_critters:
+            critters[type(critter)].append(critter)
+        for Species, stats in self.stats.items():
+            stats.rebase(critters[Species])
+
+    # BREEDING
+    def conceive(self, parent, mate=None):
+        self.conceptions.append((parent, mate))
+
+    def resolve_conceptions(self):
+        # draws the offspring genomes of all of this turn's conceptions, in one batch per species
+        batches = defaultdict(list)
+        for parent, mate in self.conceptions:
+            Species = type(parent)
+            if mate is None and Species._clone is not Critter._clone:
+                parent.offspring_genomes.append((parent._clone(), None))
+            elif mate is not None and (Species._combine_chromosomes is not Critter._combine_chromosomes
+                                       or mate.SCHEMA is not parent.SCHEMA):
+                parent.offspring_genomes.append((parent._combine_chromosomes(mate), None))
+            else:
+                batches[Species, parent.bio].append((parent, mate))
+        # the children's derived stats are worked out in the same batch and travel with their genomes
+        for (Species, bio), pairs in batches.items():
+            no_mate = np.full(len(Species.SCHEMA), np.nan)
+            genomes = np.array([parent.genome for parent, _ in pairs])
+            mate_genomes = np.array([no_mate if mate is None else mate.genome for _, mate in pairs])
+            children = Species.SCHEMA.offspring(genomes, mate_genomes, self.mutation_rng)
+            derived = bio.derive_batch(Species, children, self)
+            for (parent, _), child, stats in zip(pairs, children, derived):
+                parent.offspring_genomes.append((child, stats))
+        self.conceptions = []
+
+    # PERCEPTION
+    def perceive(self):
+        # fills every critter's perception caches for this turn in one batched pass
+        # distances and bearings between two critters are shared by both (see perception.PairTable)
+        critters = self.all_critters
+        if not critters:
+            return
+        profiler = self.profiler
+        critter_work, food_work = ({}, {}) if profiler is not None else (None, None)
+        locs = np.array([c.loc for c in critters], dtype=float)
+        table = perception.PairTable(locs, [c.per_critter for c in critters], critter_work)
+        seen_critters = self._split_pairs((table.owner, table.other, table.rho, table.phi), critters, len(critters))
+
+        foods, food_locs = self.visible_foods()
+        ci, pj, rho = perception.radius_pairs(food_locs, locs, [c.per_food for c in critters], work=food_work)
+        phi = np.arctan2(food_locs[pj,1] - locs[ci,1], food_locs[pj,0] - locs[ci,0])
+        seen_food = self._split_pairs((ci, pj, rho, phi), foods, len(critters))
+        if profiler is not None:
+            profiler.perceived('critters', len(table))
+            profiler.perceived('food', len(ci))
+            profiler.batch_search('critters', len(critters), critter_work, len(table))
+            profiler.batch_search('food', len(critters), food_work, len(ci))
+
+        for critter, (critters_found, critter_phis), (food_found, food_phis) in zip(critters, seen_critters, seen_food):
+            critter._visible_critters_cache = (self.turn, critters_found)
+            critter._visible_food_cache = (self.turn, food_found)
+            critter._bearings_cache = (self.turn, critters_found + food_found, critter_phis + food_phis)
+
+    def _split_pairs(self, pairs, things, num_centers):
+        # per-center lists of (rho, thing) and of bearings, in the order a chunk search would find them
+        ci, pj, rho, phi = pairs
+        found = list(zip(rho.tolist(), [things[j] for j in pj.tolist()]))
+        phi = phi.tolist()
+        bounds = np.searchsorted(ci, np.arange(num_centers+1)).tolist()
+        return [(found[lo:hi], phi[lo:hi]) for lo, hi in zip(bounds, bounds[1:])]
 
     # FOOD
-    def register_food_drop(self, food=None, mu=5, cv=0.2):
+    def schedule_expiry(self, food):
+        # an earlier entry for the same food is left in the heap, and skipped as stale once it comes up
+        heapq.heappush(self.food_expiry, (food.expiry, next(self._expiry_order), food))
+
+    def expire_food(self):
+        # untracks the food that has decayed away by this turn
+        queue = self.food_expiry
+        while queue and queue[0][0] <= self.turn:
+            turn, _, food = heapq.heappop(queue)
+            if food.expiry == turn:
+                food.expiry = None
+                if food in self.avail_food:     # not so for food made but never dropped
+                    self.untrack_food(food)
+
+    def register_food_drop(self, food=None, mu=5, cv=0.2, fertility=None, season=None):
+        # fertility: a drops.Fertility, or a raster of relative fertility to make one from
+        # season: a function of the turn multiplying abundance for this drop, e.g. drops.Seasons or drops.Curve
         if food is None:
             food = Food
-        self.food_drops.append((food, mu, cv))
+        if fertility is not None and not isinstance(fertility, Fertility):
+            fertility = Fertility(fertility, self.size)
+        self.food_drops.append(FoodDrop(food, mu, cv, fertility, season))
+
+    def drop_mean(self, drop):
+        # expected number of drops this turn
+        size_modifier = self.size**2 / 1000000  # div1000000 to avoid making the other numbers awkwardly small
+        abundance = self.abundance if drop.season is None else self.abundance * drop.season(self.turn)
+        return size_modifier * abundance * drop.mu * self.TURN_DURATION
+
+    def drop_locs(self, drop, count):
+        # where *count* drops land, all drawn at once
+        if drop.fertility is None:
+            return self.food_rng.random((count, 2)) * self.size
+        return drop.fertility.sample(self.food_rng, count)
 
     def drop_food(self):
-        for food, mu, cv in self.food_drops:
-            size_modifier = self.SIZE**2 / 1000000  # div1000000 to avoid making the other numbers awkwardly small
-            adjusted_mean = size_modifier * self.abundance * mu * self.TURN_DURATION
-            drop_count = round(gauss(adjusted_mean, adjusted_mean*cv))
-            for _ in range(drop_count):
-                new_food = food(self)
-                self.avail_food[self.chunk_idx(new_food.loc)].append(new_food)
+        for drop in self.food_drops:
+            adjusted_mean = self.drop_mean(drop)
+            drop_count = max(0, round(self.food_rng.normal(adjusted_mean, adjusted_mean*drop.cv)))
+            for loc in self.drop_locs(drop, drop_count).tolist():
+                new_food = drop.food(self, loc=tuple(loc))
+                self.avail_food.add(new_food, new_food.loc)
 
     # ADMIN
     def step(self):
 
         self.turn += 1
-
-        for food in self.all_food:
-            food.take_turn()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start(self.turn)
+
+        self.expire_food()
+        if self.resources is not None:
+            self.resources.step(self.abundance)
+        if profiler is not None:
+            profiler.lap('food')
         self.drop_food()
+        if profiler is not None:
+            profiler.lap('drop_food')
+        self.perceive()
+        if profiler is not None:
+            profiler.lap('perceive')
 
         self.decisions = {}
         self.results = {}
-        turn_order = sample(self.all_critters, self.pop_count)  # random action order to make it fair
+        roster = self.all_critters
+        turn_order = [roster[i] for i in self.order_rng.permutation(len(roster)).tolist()]  # random action order to make it fair
+        self.draw_wander_headings(roster)
+        if profiler is not None:
+            profiler.lap('shuffle')
         for critter in turn_order:
             decision, target = critter.take_turn()
             self.decisions[critter] = (decision, target)
             critter.last_decision = decision
             critter.last_target = target
+        if profiler is not None:
+            profiler.count_decisions(decision for decision, _ in self.decisions.values())
+            profiler.lap('decide')
 
         for critter in turn_order:
             decision, target = self.decisions[critter]
@@ -138,6 +331,8 @@ class World:
                     self.results[target] = Results.KILLED
                     target.last_result = Results.KILLED
                     target._die()
+        if profiler is not None:
+            profiler.lap('predation')
 
         for critter in turn_order:
             decision, target = self.decisions[critter]
@@ -145,16 +340,59 @@ class World:
                 result = critter.resolve_turn(decision, target)
                 self.results[critter] = result
                 critter.last_result = result
+        if profiler is not None:
+            profiler.lap('resolve')
+
+        self.resolve_conceptions()
+        if profiler is not None:
+            profiler.lap('conceptions')
+        self.critters.compact()
+        self.avail_food.compact()
+        if self.turn % self.REBUCKET_EVERY == 0:
+            self.tune_chunks()
+        if self.turn % self.REBASE_EVERY == 0:
+            self.rebase_stats()
+        if profiler is not None:
+            profiler.lap('compact')
+            profiler.end()
+
+    def draw_wander_headings(self, critters):
+        # every critter's wander heading for the turn in one draw, whether or not it ends up wandering
+        if not critters:
+            self._wander_headings = {}
+            return
+        headings = np.array([c.last_heading for c in critters])
+        faiths = np.array([c.wander_faith for c in critters], dtype=float)
+        self._wander_headings = dict(zip(critters, self.wander_rng.vonmises(headings, faiths).tolist()))
+
+    def wander_heading(self, critter):
+        # falls back to a fresh draw for critters acting outside of step
+        phi = self._wander_headings.get(critter)
+        if phi is None:
+            phi = self.wander_rng.vonmises(critter.last_heading, critter.wander_faith)
+        return phi
+
+    def population_summary(self):
+        # whole-population figures, from the running per-species totals
+        totals = [stats for stats in self.stats.values() if stats.count]
+        pop = sum(stats.count for stats in totals)
+        if not pop:
+            return {'pop': 0}
+        return {
+            'pop': pop,
+            'avg_age': sum(stats.age for stats in totals) / pop,
+            'avg_generation': sum(stats.generation for stats in totals) / pop,
+            'max_generation': max(stats.max_generation for stats in totals),
+            'avg_energy': sum(stats.energy for stats in totals) / pop,
+        }
 
     def report(self):
         for Species in self.species:
             print(f"\n{Species.__name__}")
-            extant_group = [c for c in self.all_critters if isinstance(c, Species)]
-            if extant_group:
-                for trait in Species.START_TRAITS:
-                    vals = [c.traits[trait] for c in extant_group]
-                    print(f"\t{trait}: {sum(vals)/len(vals):.2f}")
-                    #print(' '.join([f'{v:.2f}' for v in vals]))
+            stats = self.stats.get(Species)
+            if stats is not None and stats.count:
+                for trait, mean in stats.trait_means().items():
+                    print(f"\t{trait}: {mean:.2f}")
             else:
                 print("No surviving critters")
 
@@ -165,8 +403,9 @@ class World:
         self.abundance *= 50
         self.drop_food()
         self.abundance = temp
-        for food in self.all_food:
-            food.amount_left = random() * food.DEFAULT_AMOUNT
+        roster = self.all_food
+        for food, fraction in zip(roster, self.food_rng.random(len(roster)).tolist()):
+            food.amount_left = fraction * food.DEFAULT_AMOUNT
 
     def get_generator(self, turn_limit = INF):
         while self.turn < turn_limit:
@@ -181,28 +420,19 @@ def run():
     start_pop = 50
 
     world.set_up_food()
-    world.add_critters([Critter(world, age=randint(0,Critter.MAX_AGE)) for _ in range(start_pop)])
+    world.populate(Critter, start_pop, ages=world.placement_rng.integers(0, Critter.MAX_AGE, start_pop, endpoint=True))
 
-    data = Data(turns)
+    data = MetricsRecorder()
 
     while world.turn < turns and 0 < (turn_pop := world.pop_count):
         print(f"{world.turn}: {turn_pop}")
 
-        turn_pop = world.pop_count
-        all_critters = world.all_critters
-        all_food = world.all_food
-        turn = world.turn
-
-        data.pop[turn] = turn_pop
-        data.avg_age[turn] = sum([c.age for c in all_critters]) / turn_pop
-        #data.avg_generation[turn] = sum([c.generation for c in all_critters]) / turn_pop
-        data.max_generation[turn] = max([c.generation for c in all_critters])
-
-        data.avg_energy[turn] = sum([c.energy for c in all_critters]) / turn_pop
-        data.food_energy[turn] = sum([f.amount_left for f in all_food])
+        data.record(world.turn, **world.population_summary(),
+                    food_energy = world.food_energy)
 
         world.step()
 
+    data.close()
     world.report()
 
 if __name__=='__main__':